@@ -4,77 +4,143 @@ Purpose: Streamlit web app for EA Global meeting matcher
 Mobile-friendly UI for generating personalized meeting recommendations
 """
 
+import hashlib
 import hmac
+import logging
 import os
 import asyncio
+import queue
 import re
+import threading
 import time
+from dataclasses import dataclass, field
 import streamlit as st
+import numpy as np
 import pandas as pd
 
-from rapidfuzz import fuzz
+from rapidfuzz import fuzz, process
+
+# Optional: google-re2's linear-time engine for the heading patterns, which run
+# over every line of each long report. Falls back to the stdlib engine.
+try:
+    import re2 as fast_re
+except ImportError:
+    fast_re = re
 
 from utils import (
     load_csv_from_url,
     find_matches,
+    build_name_choices,
     format_row_as_pipe_delimited,
-    format_profile_for_llm,
-    format_profile_display,
+    build_profile_strings,
     filter_profiles,
     run_dual_matching_pipeline,
-    save_output,
+    create_azure_client,
+    AsyncTokenBucket,
+    save_output_async,
     compute_cost,
     PRICING_PER_1M,
+    MAX_CONCURRENT_REQUESTS,
+)
+
+log = logging.getLogger(__name__)
+
+# Compiled once at import; these run on every recommendation render.
+# Report heading: "### #1. Name — Rest" or "### #1. Name - Rest"
+_HEADING_RE = fast_re.compile(r'(###\s*#?\d+\.?\s*)([^—–\-\n]+)([\s]*[—–-].+)')
+# One report entry: the text after "### #1. " plus its body up to the next
+# ### heading. Lookahead isn't supported by RE2, so this stays on stdlib re.
+_ENTRY_RE = re.compile(
+    r'^###\s*#?\d+\.?[ \t]*(?P<heading>[^\n]+)\n?(?P<body>.*?)(?=^### |\Z)',
+    re.MULTILINE | re.DOTALL,
 )
+_DASH_SPLIT_RE = re.compile(r'\s*[—–]\s*')
+_LINK_RE = re.compile(r'\[([^\]]+)\]')
+_SCORE_RE = re.compile(r'\s*Score (\d+): (\d+) profiles')
+
+
+def frame_content_hash(df):
+    """sha256 of a frame's values, index, column labels and dtypes.
+
+    hash_pandas_object covers values and index only; headers and dtypes are
+    folded in too, since they become the field labels in profile strings.
+    """
+    content = hashlib.sha256(pd.util.hash_pandas_object(df).to_numpy().tobytes())
+    content.update(repr([(str(col), str(dtype)) for col, dtype in df.dtypes.items()]).encode("utf-8"))
+    return content.hexdigest()
+
+
+def attendee_frame_key(df):
+    """Cheap cache key for attendee frames.
+
+    Streamlit's default DataFrame hash re-hashes every cell on every call; the
+    frames here carry a content hash stamped once when the sheet is loaded.
+    """
+    key = df.attrs.get("content_hash")
+    if key is None:
+        key = frame_content_hash(df)
+    return key
+
+
+# Passed as hash_funcs to every cached function that takes an attendee frame
+ATTENDEE_FRAME_HASH = {pd.DataFrame: attendee_frame_key}
 
 
+@st.cache_data(show_spinner=False, hash_funcs=ATTENDEE_FRAME_HASH)
 def build_swapcard_lookup(df):
-    """Build a name -> Swapcard URL lookup from the DataFrame."""
-    lookup = {}
-    for _, row in df.iterrows():
-        first = str(row.get('First Name', '')).strip()
-        last = str(row.get('Last Name', '')).strip()
-        url = str(row.get('Swapcard', '')).strip()
-        if first and last and url and url.startswith('http'):
-            full_name = f"{first} {last}"
-            lookup[full_name.lower()] = url
-    return lookup
-
-
-def inject_swapcard_links(markdown_text, swapcard_lookup):
-    """Replace names in ### headings with clickable Swapcard links."""
+    """Build a name -> Swapcard URL lookup from the DataFrame (cached per dataset)."""
+    if not {'First Name', 'Last Name', 'Swapcard'}.issubset(df.columns):
+        return {}
+    first = df['First Name'].fillna('').astype(str).str.strip()
+    last = df['Last Name'].fillna('').astype(str).str.strip()
+    url = df['Swapcard'].fillna('').astype(str).str.strip()
+    mask = first.ne('') & last.ne('') & url.str.startswith('http')
+    names = (first[mask] + ' ' + last[mask]).str.lower()
+    return dict(zip(names, url[mask]))
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def inject_swapcard_links(markdown_text, dataset_key, _swapcard_lookup):
+    """Replace names in ### headings with clickable Swapcard links (memoized per report).
+
+    dataset_key (attendee_frame_key of the frame the lookup was built from)
+    stands in for the lookup in the cache key, so the dict isn't re-hashed.
+    """
+    swapcard_lookup = _swapcard_lookup
+    # Resolve every heading name up front: exact hits first, then score all
+    # the misses against the lookup in one native (multithreaded) cdist call
+    # to catch slight name variations.
+    names = {m.group(2).strip().lower() for m in _HEADING_RE.finditer(markdown_text)}
+    resolved = {n: swapcard_lookup[n] for n in names if n in swapcard_lookup}
+    misses = [n for n in names if n not in resolved]
+    keys = list(swapcard_lookup)
+    if misses and keys:
+        scores = process.cdist(misses, keys, scorer=fuzz.ratio, score_cutoff=80, workers=-1)
+        for name_lower, row in zip(misses, scores):
+            best = row.argmax()
+            if row[best] >= 80:
+                resolved[name_lower] = swapcard_lookup[keys[best]]
+
     def replace_heading(match):
-        full_line = match.group(0)
-        prefix = match.group(1)  # "### #1. "
-        name = match.group(2)    # "First Last"
-        rest = match.group(3)    # " — Role, Org"
-
-        # Fuzzy match the name against the lookup
-        name_lower = name.strip().lower()
-        if name_lower in swapcard_lookup:
-            url = swapcard_lookup[name_lower]
-            return f"{prefix}[{name}]({url}){rest}"
-
-        # Try fuzzy matching for slight name variations
-        best_match = None
-        best_score = 0
-        for lookup_name, url in swapcard_lookup.items():
-            score = fuzz.ratio(name_lower, lookup_name)
-            if score > best_score:
-                best_score = score
-                best_match = (lookup_name, url)
-        if best_match and best_score >= 80:
-            url = best_match[1]
-            return f"{prefix}[{name}]({url}){rest}"
-
-        return full_line
-
-    # Match "### #1. Name — Rest" or "### #1. Name - Rest"
-    return re.sub(
-        r'(###\s*#?\d+\.?\s*)([^—–\-\n]+)([\s]*[—–-].+)',
-        replace_heading,
-        markdown_text
-    )
+        prefix, name, rest = match.groups()  # "### #1. ", "First Last", " — Role, Org"
+        url = resolved.get(name.strip().lower())
+        if url is None:
+            return match.group(0)
+        return f"{prefix}[{name}]({url}){rest}"
+
+    return _HEADING_RE.sub(replace_heading, markdown_text)
+
+def build_score_chart(status_msgs):
+    """Score (1-10) -> profile count frame for st.bar_chart, or None if absent."""
+    pairs = (_SCORE_RE.match(msg) for msg in status_msgs)
+    dist = {int(m[1]): int(m[2]) for m in pairs if m}
+    if not dist:
+        return None
+    counts = np.zeros(10, dtype=np.int32)
+    for score, n in dist.items():
+        if 1 <= score <= 10:
+            counts[score - 1] = n
+    return pd.DataFrame({"Profiles": counts}, index=pd.RangeIndex(1, 11, name="Score"))
 
 # Page config - mobile-friendly
 st.set_page_config(
@@ -97,9 +163,8 @@ st.markdown("""
 
 # Configuration
 OUTPUT_DIR = "outputs/matches"
-
-# Ensure output directory exists
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+SCORE_CACHE_PATH = "outputs/score_cache.sqlite3"  # per-profile scores reused across runs
+SCORING_CHUNK_SIZE = 60  # profiles per scoring call (both directions per call)
 
 
 def get_config():
@@ -117,29 +182,189 @@ def get_config():
         "azure_endpoint": _get("AZURE_OPENAI_ENDPOINT"),
         "azure_deployment": _get("AZURE_OPENAI_DEPLOYMENT", "gpt-5.2"),
         "azure_api_version": _get("AZURE_OPENAI_API_VERSION", "2024-12-01-preview"),
+        "azure_scoring_deployments": [
+            d.strip() for d in str(_get("AZURE_OPENAI_SCORING_DEPLOYMENTS")).split(",") if d.strip()
+        ],
+        "max_concurrent_requests": int(_get("MAX_CONCURRENT_REQUESTS", MAX_CONCURRENT_REQUESTS)),
+        "requests_per_minute": int(_get("AZURE_REQUESTS_PER_MINUTE", 0)) or None,
+        "use_batch_api": str(_get("AZURE_USE_BATCH_API", "")).lower() in ("1", "true", "yes"),
+        "min_shared_keywords": int(_get("MIN_SHARED_KEYWORDS", 0)),
     }
 
+
+# How long a downloaded attendee sheet is reused before re-fetching
+CSV_CACHE_TTL_SECONDS = 600
+
+
+@st.cache_data(ttl=CSV_CACHE_TTL_SECONDS, show_spinner=False)
+def load_attendees(csv_url):
+    """Download the attendee CSV, shared across sessions for the TTL window."""
+    df, load_msg = load_csv_from_url(csv_url)
+    df.attrs["content_hash"] = frame_content_hash(df)
+    return df, load_msg
+
+
+@st.cache_data(ttl=CSV_CACHE_TTL_SECONDS, show_spinner=False, hash_funcs=ATTENDEE_FRAME_HASH)
+def filter_attendees(df, min_chars):
+    """Filter incomplete profiles, cached alongside the downloaded sheet."""
+    df_filtered, original_count, filtered_count = filter_profiles(df, min_chars=min_chars)
+    # Row selection copies attrs, so give the subset its own key
+    df_filtered.attrs["content_hash"] = f"{attendee_frame_key(df)}:min_chars={min_chars}"
+    return df_filtered, original_count, filtered_count
+
+
+# Attendee-frame resources kept at once: the current sheet plus the previous
+# version, for sessions still mid-run when the TTL refresh lands. Older
+# versions are evicted instead of piling up over the event.
+DATASET_VERSIONS_KEPT = 2
+
+
+@st.cache_resource(show_spinner=False, max_entries=DATASET_VERSIONS_KEPT,
+                   hash_funcs=ATTENDEE_FRAME_HASH)
+def name_search_index(df):
+    """Display names and lowercased search keys for fuzzy name search.
+
+    A shared resource rather than cache_data: the choices are read-only, so
+    every search can use the same objects instead of unpickling a fresh copy.
+    """
+    return build_name_choices(df)
+
+
+@st.cache_data(show_spinner=False, max_entries=256, hash_funcs=ATTENDEE_FRAME_HASH)
+def search_attendees(df, name, limit=5):
+    """Fuzzy name search, memoized so repeat queries return instantly."""
+    return find_matches(df, name, limit=limit, name_choices=name_search_index(df))
+
+
+@st.cache_resource(show_spinner=False, max_entries=DATASET_VERSIONS_KEPT,
+                   hash_funcs=ATTENDEE_FRAME_HASH)
+def profile_strings(df):
+    """(display, llm) string arrays for every attendee, in df.iloc order.
+
+    A shared resource like name_search_index: read-only, so no per-run copy.
+    """
+    return build_profile_strings(df)
+
+
+@st.cache_data(show_spinner=False, max_entries=DATASET_VERSIONS_KEPT,
+               hash_funcs=ATTENDEE_FRAME_HASH)
+def profile_corpus(df, df_filtered):
+    """LLM-ready JSON for every scored profile, keyed by df_filtered index."""
+    _, llm_strings = profile_strings(df)
+    positions = df.index.get_indexer(df_filtered.index)
+    return dict(zip(df_filtered.index, llm_strings[positions]))
+
+
+@st.cache_resource
+def get_azure_client(api_key, endpoint, api_version):
+    """One Azure OpenAI client (and its warm connection pool) for all runs."""
+    return create_azure_client(api_key, endpoint, api_version)
+
+
+@st.cache_resource
+def get_rate_limiter(requests_per_minute):
+    """One RPM token bucket shared by every session's runs.
+
+    A bucket per run would let concurrent users each burst the full quota.
+    Only ever awaited on the pipeline loop, so its lock stays on one loop.
+    """
+    return AsyncTokenBucket(requests_per_minute) if requests_per_minute else None
+
+
+@st.cache_resource
+def get_pipeline_loop():
+    """A single long-lived event loop on a daemon thread.
+
+    The cached client's connection pool is bound to the loop it was first used
+    on, so every run goes through this loop instead of a fresh asyncio.run().
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="pipeline-loop", daemon=True).start()
+    return loop
+
+
+def run_pipeline_in_background(make_coro, *callbacks):
+    """Run a pipeline coroutine on the shared loop and wait for its result.
+
+    Streamlit elements can only be updated from the script thread, so each
+    callback is wrapped to queue its calls, which are replayed here while we
+    wait. make_coro receives the wrapped callbacks in the same order.
+    """
+    pending = queue.Queue()
+
+    def deferred(fn):
+        return lambda *args: pending.put((fn, args))
+
+    future = asyncio.run_coroutine_threadsafe(
+        make_coro(*[deferred(cb) for cb in callbacks]), get_pipeline_loop())
+    try:
+        while True:
+            try:
+                fn, args = pending.get(timeout=0.1)
+            except queue.Empty:
+                if future.done():
+                    break
+                continue
+            fn(*args)
+    except BaseException:
+        # Script rerun/stop while waiting: don't leave the run burning tokens
+        future.cancel()
+        raise
+    return future.result()
+
+
+@st.cache_resource
+def ensure_output_dir(path):
+    """Create the output directory once per process, not on every rerun."""
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def save_outputs_in_background(user_name, get_response, give_response):
+    """Write both reports to disk off the script thread.
+
+    The reports are already in session state, so the UI doesn't wait on file
+    I/O; a failed write is logged rather than shown.
+    """
+    output_dir = ensure_output_dir(OUTPUT_DIR)
+
+    async def write_both():
+        await asyncio.gather(
+            save_output_async(user_name, get_response, output_dir, suffix="_get_value"),
+            save_output_async(user_name, give_response, output_dir, suffix="_give_value"),
+        )
+
+    def log_failure(future):
+        if not future.cancelled() and future.exception() is not None:
+            log.error("Saving reports failed: %s", future.exception())
+
+    future = asyncio.run_coroutine_threadsafe(write_both(), get_pipeline_loop())
+    future.add_done_callback(log_failure)
+
+
+@dataclass(slots=True)
+class AppState:
+    """Everything a session remembers between reruns, stored as one object."""
+    authenticated: bool = False
+    failed_attempts: int = 0
+    lockout_until: float = 0.0
+    data_loaded: bool = False
+    search_performed: bool = False
+    last_searched_name: str = ""
+    matches: list = field(default_factory=list)
+    selected_match: dict | None = None
+    dataset_key: str | None = None  # attendee_frame_key of the frame searched
+    recommendations_get: str | None = None
+    recommendations_give: str | None = None
+    scoring_status_get: list | None = None
+    scoring_status_give: list | None = None
+    scoring_chart_get: pd.DataFrame | None = None
+    scoring_chart_give: pd.DataFrame | None = None
+
+
 # Initialize session state
-if 'authenticated' not in st.session_state:
-    st.session_state.authenticated = False
-if 'search_performed' not in st.session_state:
-    st.session_state.search_performed = False
-if 'matches' not in st.session_state:
-    st.session_state.matches = []
-if 'selected_match' not in st.session_state:
-    st.session_state.selected_match = None
-if 'df' not in st.session_state:
-    st.session_state.df = None
-if 'df_filtered' not in st.session_state:
-    st.session_state.df_filtered = None
-if 'recommendations_get' not in st.session_state:
-    st.session_state.recommendations_get = None
-if 'recommendations_give' not in st.session_state:
-    st.session_state.recommendations_give = None
-if 'scoring_status_get' not in st.session_state:
-    st.session_state.scoring_status_get = None
-if 'scoring_status_give' not in st.session_state:
-    st.session_state.scoring_status_give = None
+if 'state' not in st.session_state:
+    st.session_state.state = AppState()
 
 
 def check_password(config):
@@ -149,78 +374,55 @@ def check_password(config):
         st.error("⚠️ Missing configuration. Please set CSV_URL, APP_PASSWORD, AZURE_API_KEY, and AZURE_OPENAI_ENDPOINT in secrets.")
         st.stop()
 
-    # Initialize failed attempts tracking
-    if 'failed_attempts' not in st.session_state:
-        st.session_state.failed_attempts = 0
+    state = st.session_state.state
 
     st.title("🔒 EA Global Meeting Matcher")
     st.markdown("This app is password protected. Please enter the password to continue.")
 
     # Show lockout message if too many failed attempts
-    if st.session_state.failed_attempts >= 5:
-        lockout_seconds = 2 ** st.session_state.failed_attempts
-        st.error(f"⚠️ Too many failed attempts. Please wait ~{lockout_seconds}s before trying again.")
-
-    password_input = st.text_input("Password:", type="password", key="password_input")
-
-    col1, col2, col3 = st.columns([1, 1, 2])
-    with col1:
-        unlock_button = st.button("🔓 Unlock", use_container_width=True)
-
-    # Trigger on button click or Enter key (password value changed)
-    password_submitted = password_input and password_input != st.session_state.get('last_password_attempt', '')
-    if (unlock_button or password_submitted) and password_input:
-        st.session_state.last_password_attempt = password_input
+    lockout_remaining = state.lockout_until - time.time()
+    if lockout_remaining > 0:
+        st.error(f"⚠️ Too many failed attempts. Please wait ~{int(lockout_remaining) + 1}s before trying again.")
+
+    # A form submits on both the button and the Enter key, so there's no need
+    # to keep the previous attempt around to detect a changed value.
+    with st.form("password_form", border=False):
+        password_input = st.text_input("Password:", type="password", key="password_input")
+
+        col1, col2, col3 = st.columns([1, 1, 2])
+        with col1:
+            unlock_button = st.form_submit_button("🔓 Unlock", use_container_width=True)
+
+    if unlock_button and password_input:
+        # Locked out: reject before doing any comparison work
+        if time.time() < state.lockout_until:
+            st.stop()
         if hmac.compare_digest(password_input, config["app_password"]):
-            st.session_state.authenticated = True
-            st.session_state.failed_attempts = 0
+            state.authenticated = True
+            state.failed_attempts = 0
+            state.lockout_until = 0.0
             st.rerun()
         else:
-            st.session_state.failed_attempts += 1
-            if st.session_state.failed_attempts >= 5:
-                st.error(f"❌ Incorrect password. Too many attempts — please wait before retrying.")
+            state.failed_attempts += 1
+            if state.failed_attempts >= 5:
+                lockout_seconds = min(2 ** state.failed_attempts, 300)
+                state.lockout_until = time.time() + lockout_seconds
+                st.error(f"❌ Incorrect password. Too many attempts — please wait {lockout_seconds}s before retrying.")
             else:
-                st.error(f"❌ Incorrect password ({5 - st.session_state.failed_attempts} attempts remaining)")
+                st.error(f"❌ Incorrect password ({5 - state.failed_attempts} attempts remaining)")
 
     st.stop()
 
 
-def main():
-    # Get configuration
-    config = get_config()
-
-    # Check password first
-    if not st.session_state.authenticated:
-        check_password(config)
-
-    st.title("🤝 EA Global Meeting Matcher")
-    st.markdown("Find the best people to meet at EA Global based on your profile")
-
-    # Load CSV from URL (cached in session state)
-    if st.session_state.df is None:
-        with st.spinner("📥 Downloading latest attendee data from Google Sheets..."):
-            try:
-                st.session_state.df, load_msg = load_csv_from_url(config["csv_url"])
-                st.success(load_msg)
-            except Exception as e:
-                st.error(f"Failed to load CSV: {e}")
-                st.stop()
-
-    df = st.session_state.df
-
-    # Filter profiles (cached in session state)
-    if st.session_state.df_filtered is None:
-        with st.spinner("🔄 Filtering incomplete profiles..."):
-            try:
-                df_filtered, original_count, filtered_count = filter_profiles(df, min_chars=200)
-                st.session_state.df_filtered = df_filtered
-                excluded = original_count - filtered_count
-                st.success(f"Scoring {filtered_count} of {original_count} attendees ({excluded} excluded for having fewer than 200 characters of profile info)")
-            except Exception as e:
-                st.error(f"Failed to filter profiles: {e}")
-                st.stop()
+@st.fragment
+def name_search_step(df):
+    """Steps 1-2 (name search + profile pick) as a fragment.
 
-    df_filtered = st.session_state.df_filtered
+    Typing and re-searching only rerun this block; the full page reruns once a
+    different profile is picked so the steps below see the new selection.
+    """
+    state = st.session_state.state
+    previous = state.selected_match
 
     # Step 1: Name search
     st.header("1️⃣ Find Your Profile")
@@ -237,28 +439,32 @@ def main():
         search_button = st.button("🔍 Search", type="primary", use_container_width=True)
 
     # Trigger search on button click OR when name changes (Enter key submits the text_input)
-    name_changed = name and name != st.session_state.get('last_searched_name', '')
+    name_changed = name and name != state.last_searched_name
     if (search_button or name_changed) and name:
-        st.session_state.last_searched_name = name
+        state.last_searched_name = name
         with st.spinner(f"Searching for '{name}'..."):
-            matches = find_matches(df, name, limit=5)
+            matches = search_attendees(df, name, limit=5)
             if matches:
-                st.session_state.matches = matches
-                st.session_state.search_performed = True
-                st.session_state.selected_match = None
-                st.success(f"Found {len(matches)} potential matches")
+                state.matches = matches
+                state.search_performed = True
+                state.selected_match = None
             else:
                 st.warning("No matches found. Try a different name or spelling.")
-                st.session_state.search_performed = False
+                state.search_performed = False
+
+    # Rendered from state rather than inside the search branch so the notice
+    # survives the full rerun that follows a new selection.
+    if state.search_performed and state.matches:
+        st.success(f"Found {len(state.matches)} potential matches")
 
     # Step 2: Select match
-    if st.session_state.search_performed and st.session_state.matches:
+    if state.search_performed and state.matches:
         st.header("2️⃣ Select Your Profile")
 
         # Create options for selectbox
         match_options = [
             f"{match_name} (match: {score:.0f}%)"
-            for match_name, score, idx in st.session_state.matches
+            for match_name, score, idx in state.matches
         ]
         match_options.append("➕ Custom Profile (paste your own)")
 
@@ -277,7 +483,7 @@ def main():
                 placeholder="Paste your EA Global profile text here..."
             )
             if custom_profile.strip():
-                st.session_state.selected_match = {
+                state.selected_match = {
                     'type': 'custom',
                     'profile': custom_profile,
                     'name': '[Custom Profile]'
@@ -285,36 +491,91 @@ def main():
         else:
             # Find the selected match
             selected_idx = match_options.index(selected_option)
-            match_name, score, idx = st.session_state.matches[selected_idx]
-            matched_row = df.iloc[idx]
+            match_name, score, idx = state.matches[selected_idx]
 
-            st.session_state.selected_match = {
+            # Resolve the profile text now: the shared frame is re-downloaded
+            # on a TTL, so a position alone could later point at someone else.
+            display_strings, llm_strings = profile_strings(df)
+            state.selected_match = {
                 'type': 'csv',
-                'row': matched_row,
                 'name': match_name,
                 'score': score,
-                'idx': idx  # positional index in df
+                'idx': idx,  # positional index in df
+                'display': display_strings[idx],
+                'profile': llm_strings[idx],
             }
 
+    if state.selected_match != previous:
+        st.rerun()
+
+
+def main():
+    state = st.session_state.state
+
+    # Get configuration
+    config = get_config()
+
+    # Check password first
+    if not state.authenticated:
+        check_password(config)
+
+    st.title("🤝 EA Global Meeting Matcher")
+    st.markdown("Find the best people to meet at EA Global based on your profile")
+
+    # Load CSV from URL and filter profiles (cached across sessions)
+    with st.spinner("📥 Downloading latest attendee data from Google Sheets..."):
+        try:
+            df, load_msg = load_attendees(config["csv_url"])
+        except Exception as e:
+            st.error(f"Failed to load CSV: {e}")
+            st.stop()
+
+    with st.spinner("🔄 Filtering incomplete profiles..."):
+        try:
+            df_filtered, original_count, filtered_count = filter_attendees(df, min_chars=200)
+        except Exception as e:
+            st.error(f"Failed to filter profiles: {e}")
+            st.stop()
+
+    # Only announce the data on the first run of a session, not every rerun
+    if not state.data_loaded:
+        state.data_loaded = True
+        excluded = original_count - filtered_count
+        st.success(load_msg)
+        st.success(f"Scoring {filtered_count} of {original_count} attendees ({excluded} excluded for having fewer than 200 characters of profile info)")
+
+    # Search results are row positions in the shared frame, which refreshes on
+    # a TTL; when its content changes they point at the wrong rows, so drop
+    # them and let the search rerun against the new data.
+    dataset_key = attendee_frame_key(df)
+    if state.dataset_key != dataset_key:
+        if state.dataset_key is not None and (state.matches or state.selected_match):
+            st.toast("The attendee list was updated, so your search was run again.")
+        state.dataset_key = dataset_key
+        state.matches = []
+        state.selected_match = None
+        state.search_performed = False
+        state.last_searched_name = ""
+
+    name_search_step(df)
+
     # Step 3: Display profile and get additional context
-    if st.session_state.selected_match:
+    if state.selected_match:
         st.header("3️⃣ Review Your Profile")
 
-        match_data = st.session_state.selected_match
+        match_data = state.selected_match
 
         if match_data['type'] == 'custom':
             st.info("**Using custom profile:**")
             st.text_area("Your profile:", value=match_data['profile'], height=200, disabled=True)
         else:
-            matched_row = match_data['row']
             if match_data['score'] < 100:
                 st.info(f"**Matched:** {match_data['name']} (confidence: {match_data['score']:.0f}%)")
             else:
                 st.success(f"**Exact match:** {match_data['name']}")
 
             with st.expander("📋 View full profile", expanded=True):
-                profile_display = format_profile_display(matched_row)
-                st.markdown(profile_display)
+                st.markdown(match_data['display'])
 
         # Additional context
         st.subheader("Additional Context (Optional)")
@@ -332,10 +593,7 @@ def main():
 
         if generate_button:
             # Prepare user profile
-            if match_data['type'] == 'custom':
-                user_profile = match_data['profile']
-            else:
-                user_profile = format_profile_for_llm(match_data['row'])
+            user_profile = match_data['profile']
 
             st.info(f"📊 Running dual pipeline: scoring {len(df_filtered)} profiles for both GET and GIVE value, then selecting top 25 for each...")
 
@@ -354,7 +612,7 @@ def main():
             # batch count is NOT doubled.
             import math
             num_profiles = len(df_filtered) - (1 if user_idx is not None else 0)
-            total_batches = math.ceil(num_profiles / 60)
+            total_batches = math.ceil(num_profiles / SCORING_CHUNK_SIZE)
 
             progress_state = {"completed": 0, "start_time": time.time(), "generating_finals": False}
             FINAL_REPORT_SECONDS = 120  # estimated time for final report generation
@@ -368,6 +626,8 @@ def main():
                     return
                 progress_state["completed"] += 1
                 done = progress_state["completed"]
+                # Cached scores can make the real batch count smaller than estimated
+                total_batches = total_in_direction
                 elapsed = time.time() - progress_state["start_time"]
                 # Reserve last 10% of bar for final report generation
                 pct = min(done / total_batches * 0.9, 0.9)
@@ -390,9 +650,29 @@ def main():
                 progress_bar.progress(0.92)
                 progress_text.caption("Scoring complete! Generating final reports — ~2m remaining")
 
+            # Show each final report as soon as it lands, while the other one
+            # is still generating. Links are injected here so the finished
+            # results below can reuse them.
+            swapcard_lookup = build_swapcard_lookup(df)
+            linked_reports = {}
+            report_previews = {"get_value": st.empty(), "give_value": st.empty()}
+            preview_titles = {"get_value": "🎯 Who to Meet FOR YOU", "give_value": "🎁 Who to Meet TO HELP THEM"}
+
+            def on_report_stream(direction, partial_text):
+                with report_previews[direction].container():
+                    st.caption(f"{preview_titles[direction]} — writing...")
+                    st.markdown(partial_text)
+
+            def on_report_ready(direction, text):
+                linked_reports[direction] = inject_swapcard_links(text, attendee_frame_key(df), swapcard_lookup)
+                with report_previews[direction].expander(f"{preview_titles[direction]} — ready (preview)", expanded=True):
+                    st.markdown(linked_reports[direction])
+                if len(linked_reports) < len(report_previews):
+                    progress_text.caption("First report ready! Finishing the other one...")
+
             try:
-                (get_result, give_result) = asyncio.run(
-                    run_dual_matching_pipeline(
+                (get_result, give_result) = run_pipeline_in_background(
+                    lambda on_batch, on_final, on_report, on_stream: run_dual_matching_pipeline(
                         df_filtered,
                         match_data['name'],
                         user_profile,
@@ -400,13 +680,25 @@ def main():
                         azure_endpoint=config["azure_endpoint"],
                         azure_deployment=config["azure_deployment"],
                         azure_api_version=config["azure_api_version"],
-                        chunk_size=60,
+                        chunk_size=SCORING_CHUNK_SIZE,
+                        max_concurrent=config["max_concurrent_requests"],
+                        rate_limiter=get_rate_limiter(config["requests_per_minute"]),
+                        score_cache_path=SCORE_CACHE_PATH,
+                        min_shared_keywords=config["min_shared_keywords"],
+                        use_batch_api=config["use_batch_api"],
+                        scoring_deployments=config["azure_scoring_deployments"],
                         min_score=8,
                         additional_context=additional_context.strip() if additional_context.strip() else None,
                         user_idx=user_idx,
-                        progress_callback=on_batch_complete,
-                        final_callback=on_final_start
-                    )
+                        progress_callback=on_batch,
+                        final_callback=on_final,
+                        report_callback=on_report,
+                        stream_callback=on_stream,
+                        client=get_azure_client(config["azure_api_key"], config["azure_endpoint"],
+                                                config["azure_api_version"]),
+                        profile_texts=profile_corpus(df, df_filtered),
+                    ),
+                    on_batch_complete, on_final_start, on_report_ready, on_report_stream,
                 )
 
                 progress_bar.progress(1.0)
@@ -415,45 +707,20 @@ def main():
                 get_response, get_scores, get_status, get_usage = get_result
                 give_response, give_scores, give_status, give_usage = give_result
 
-                # Inject Swapcard links into names
-                swapcard_lookup = build_swapcard_lookup(df)
-                get_response = inject_swapcard_links(get_response, swapcard_lookup)
-                give_response = inject_swapcard_links(give_response, swapcard_lookup)
+                # Swapcard links were injected as each report arrived
+                get_response = linked_reports["get_value"]
+                give_response = linked_reports["give_value"]
 
-                # Clear progress indicators
+                # Clear progress indicators and previews
                 progress_bar.empty()
                 progress_text.empty()
+                for preview in report_previews.values():
+                    preview.empty()
 
-                # Show scoring details as bar charts
-                def parse_score_distribution(status_msgs):
-                    dist = {}
-                    for msg in status_msgs:
-                        m = re.match(r'\s*Score (\d+): (\d+) profiles', msg)
-                        if m:
-                            dist[int(m.group(1))] = int(m.group(2))
-                    return dist
-
-                get_dist = parse_score_distribution(get_status)
-                give_dist = parse_score_distribution(give_status)
-
-                with status_container.expander("📊 Scoring details", expanded=True):
-                    chart_col1, chart_col2 = st.columns(2)
-                    with chart_col1:
-                        st.caption("🎯 Get Value (for you)")
-                        if get_dist:
-                            chart_df = pd.DataFrame({
-                                "Score": range(1, 11),
-                                "Profiles": [get_dist.get(i, 0) for i in range(1, 11)]
-                            }).set_index("Score")
-                            st.bar_chart(chart_df)
-                    with chart_col2:
-                        st.caption("🎁 Give Value (for them)")
-                        if give_dist:
-                            chart_df = pd.DataFrame({
-                                "Score": range(1, 11),
-                                "Profiles": [give_dist.get(i, 0) for i in range(1, 11)]
-                            }).set_index("Score")
-                            st.bar_chart(chart_df)
+                # Scoring charts are built once here and drawn from session
+                # state with the results below, so they survive later reruns.
+                state.scoring_chart_get = build_score_chart(get_status)
+                state.scoring_chart_give = build_score_chart(give_status)
 
                 # Token usage & cost breakdown (Stage 1 = scoring, Stage 2 = final
                 # reports; both directions summed into each stage).
@@ -494,12 +761,11 @@ def main():
                     st.metric("Total estimated cost", f"${compute_cost(total_u):,.4f}")
 
                 # Save results
-                save_output(match_data['name'], get_response, OUTPUT_DIR, suffix="_get_value")
-                save_output(match_data['name'], give_response, OUTPUT_DIR, suffix="_give_value")
-                st.session_state.recommendations_get = get_response
-                st.session_state.recommendations_give = give_response
-                st.session_state.scoring_status_get = get_status
-                st.session_state.scoring_status_give = give_status
+                save_outputs_in_background(match_data['name'], get_response, give_response)
+                state.recommendations_get = get_response
+                state.recommendations_give = give_response
+                state.scoring_status_get = get_status
+                state.scoring_status_give = give_status
 
                 st.success("✅ Recommendations generated successfully!")
 
@@ -508,28 +774,40 @@ def main():
                 st.stop()
 
     # Step 5: Display results
-    if st.session_state.recommendations_get:
+    if state.recommendations_get:
         st.header("5️⃣ Your Meeting Recommendations")
 
+        if state.scoring_chart_get is not None or state.scoring_chart_give is not None:
+            with st.expander("📊 Scoring details"):
+                chart_col1, chart_col2 = st.columns(2)
+                with chart_col1:
+                    st.caption("🎯 Get Value (for you)")
+                    if state.scoring_chart_get is not None:
+                        st.bar_chart(state.scoring_chart_get)
+                with chart_col2:
+                    st.caption("🎁 Give Value (for them)")
+                    if state.scoring_chart_give is not None:
+                        st.bar_chart(state.scoring_chart_give)
+
         main_tab1, main_tab2, main_tab3 = st.tabs(["🎯 Who to Meet FOR YOU", "🎁 Who to Meet TO HELP THEM", "⭐ On Both Lists"])
 
         with main_tab1:
-            st.markdown(st.session_state.recommendations_get)
+            st.markdown(state.recommendations_get)
             st.download_button(
                 label="⬇️ Download",
-                data=st.session_state.recommendations_get,
-                file_name=f"{st.session_state.selected_match['name'].replace(' ', '_')}_get_value.md",
+                data=state.recommendations_get,
+                file_name=f"{state.selected_match['name'].replace(' ', '_')}_get_value.md",
                 mime="text/markdown",
                 use_container_width=True,
                 key="dl_get_md"
             )
 
         with main_tab2:
-            st.markdown(st.session_state.recommendations_give)
+            st.markdown(state.recommendations_give)
             st.download_button(
                 label="⬇️ Download",
-                data=st.session_state.recommendations_give,
-                file_name=f"{st.session_state.selected_match['name'].replace(' ', '_')}_give_value.md",
+                data=state.recommendations_give,
+                file_name=f"{state.selected_match['name'].replace(' ', '_')}_give_value.md",
                 mime="text/markdown",
                 use_container_width=True,
                 key="dl_give_md"
@@ -542,50 +820,42 @@ def main():
                 entries = {}
                 if not markdown_text:
                     return entries
-                # Split on ### headings
-                parts = re.split(r'(?=^### )', markdown_text, flags=re.MULTILINE)
-                for part in parts:
-                    part = part.strip()
-                    if not part.startswith('###'):
-                        continue
-                    heading_line = part.split('\n')[0]
-                    # Extract full heading after "### #1. "
-                    heading_match = re.match(r'###\s*#?\d+\.?\s*(.+)', heading_line)
-                    if heading_match:
-                        full_heading = heading_match.group(1).strip()
-                        # Get name: strip markdown link syntax [Name](url) if present
-                        name_part = re.split(r'\s*[—–]\s*', full_heading)[0].strip()
-                        link_match = re.match(r'\[([^\]]+)\]', name_part)
-                        name = link_match.group(1) if link_match else name_part
-                        # Get everything after the heading line
-                        body_lines = part.split('\n')[1:]
-                        body = '\n'.join(l for l in body_lines if l.strip() and l.strip() != '---')
-                        entries[name.lower()] = {
-                            'name': name,
-                            'heading': full_heading,
-                            'body': body.strip()
-                        }
+                # One pass over the report: each match is a numbered heading
+                # plus everything up to the next ### heading (or the end).
+                for entry_match in _ENTRY_RE.finditer(markdown_text):
+                    full_heading = entry_match.group('heading').strip()
+                    # Get name: strip markdown link syntax [Name](url) if present
+                    name_part = _DASH_SPLIT_RE.split(full_heading)[0].strip()
+                    link_match = _LINK_RE.match(name_part)
+                    name = link_match.group(1) if link_match else name_part
+                    body_lines = entry_match.group('body').split('\n')
+                    body = '\n'.join(l for l in body_lines if l.strip() and l.strip() != '---')
+                    entries[name.lower()] = {
+                        'name': name,
+                        'heading': full_heading,
+                        'body': body.strip()
+                    }
                 return entries
 
-            get_entries = extract_entries(st.session_state.recommendations_get)
-            give_entries = extract_entries(st.session_state.recommendations_give)
+            get_entries = extract_entries(state.recommendations_get)
+            give_entries = extract_entries(state.recommendations_give)
 
             # Find overlapping names (exact match on lowercase)
             overlap_names = set(get_entries.keys()) & set(give_entries.keys())
 
-            # Also try fuzzy matching for near-matches
-            if len(overlap_names) < len(get_entries):
-                for get_key in get_entries:
-                    if get_key in overlap_names:
-                        continue
-                    for give_key in give_entries:
-                        if give_key in overlap_names:
-                            continue
-                        if fuzz.ratio(get_key, give_key) >= 85:
-                            overlap_names.add(get_key)
-                            # Store the give_key mapping
-                            get_entries[get_key]['_give_key'] = give_key
-                            break
+            # Also try fuzzy matching for near-matches, scoring every remaining
+            # get/give pair in one native cdist call
+            fuzzy_get = [k for k in get_entries if k not in overlap_names]
+            fuzzy_give = [k for k in give_entries if k not in overlap_names]
+            if fuzzy_get and fuzzy_give:
+                pair_scores = process.cdist(fuzzy_get, fuzzy_give, scorer=fuzz.ratio,
+                                            score_cutoff=85, workers=-1)
+                for get_key, row in zip(fuzzy_get, pair_scores):
+                    best = row.argmax()
+                    if row[best] >= 85:
+                        overlap_names.add(get_key)
+                        # Store the give_key mapping
+                        get_entries[get_key]['_give_key'] = fuzzy_give[best]
 
             if overlap_names:
                 st.success(f"**{len(overlap_names)} people appear on both lists** — these are your highest-priority meetings!")
@@ -608,14 +878,7 @@ def main():
         # Reset button
         st.divider()
         if st.button("🔄 Start New Search", use_container_width=True):
-            st.session_state.search_performed = False
-            st.session_state.matches = []
-            st.session_state.selected_match = None
-            st.session_state.recommendations_get = None
-            st.session_state.recommendations_give = None
-            st.session_state.scoring_status_get = None
-            st.session_state.scoring_status_give = None
-            st.session_state.last_searched_name = ''
+            st.session_state.state = AppState(authenticated=True, data_loaded=True)
             st.rerun()
 
     # Footer
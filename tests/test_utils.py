@@ -0,0 +1,320 @@
+"""Tests for utils.py. Run with: python -m unittest discover tests"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import types
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils
+
+
+def _ns(**kwargs):
+    return types.SimpleNamespace(**kwargs)
+
+
+class StubBatchClient:
+    """Just enough of AsyncAzureOpenAI's files/batches API for one Batch job."""
+
+    def __init__(self, output_lines, statuses=("in_progress", "completed")):
+        self.statuses = list(statuses)
+        self.output_lines = output_lines
+        self.uploaded = None
+        self.files = _ns(create=self._create_file, content=self._file_content)
+        self.batches = _ns(create=self._create_batch, retrieve=self._retrieve_batch)
+
+    async def _create_file(self, file, purpose):
+        self.uploaded = file[1].decode("utf-8")
+        return _ns(id="file-in")
+
+    async def _create_batch(self, input_file_id, endpoint, completion_window):
+        return self._job()
+
+    async def _retrieve_batch(self, job_id):
+        return self._job()
+
+    def _job(self):
+        status = self.statuses.pop(0) if len(self.statuses) > 1 else self.statuses[0]
+        output = "file-out" if status == "completed" else None
+        return _ns(id="batch-1", status=status, output_file_id=output)
+
+    async def _file_content(self, file_id):
+        return _ns(text="\n".join(json.dumps(line) for line in self.output_lines))
+
+
+def _output_line(batch_num, content, status_code=200):
+    return {
+        "custom_id": f"batch-{batch_num}",
+        "response": {
+            "status_code": status_code,
+            "body": {
+                "choices": [{"message": {"content": content}}],
+                "usage": {"prompt_tokens": 10, "completion_tokens": 2, "total_tokens": 12},
+            },
+        },
+    }
+
+
+class RunScoringBatchJobTest(unittest.TestCase):
+    def run_job(self, client, message_lists):
+        status = []
+        with mock.patch.object(utils, "BATCH_API_POLL_SECONDS", 0):
+            outputs = asyncio.run(utils._run_scoring_batch_job(
+                client, "deploy", message_lists, "key", status))
+        return outputs, status
+
+    def test_returns_successful_outputs_by_batch_number(self):
+        client = StubBatchClient([
+            _output_line(1, '{"scores": []}'),
+            _output_line(2, "ignored", status_code=500),
+        ])
+        messages = [[{"role": "user", "content": "a"}], [{"role": "user", "content": "b"}]]
+
+        outputs, status = self.run_job(client, messages)
+
+        self.assertEqual(list(outputs), [1])
+        text, usage = outputs[1]
+        self.assertEqual(text, '{"scores": []}')
+        self.assertEqual(usage.prompt_tokens, 10)
+        self.assertIn("Submitted 2 scoring requests", status[0])
+        self.assertEqual(len(client.uploaded.splitlines()), 2)
+
+    def test_job_without_output_returns_nothing(self):
+        client = StubBatchClient([], statuses=("failed",))
+
+        outputs, status = self.run_job(client, [[{"role": "user", "content": "a"}]])
+
+        self.assertEqual(outputs, {})
+        self.assertIn("no output", status[-1])
+
+
+class StubChatClient:
+    """Scoring replies that leave out the given 1-based profile numbers.
+
+    Batches of more than truncate_above profiles come back cut off at the
+    output-token limit. Every reply reports 10 prompt / 5 completion tokens.
+    """
+
+    def __init__(self, skip=(), truncate_above=None):
+        self.skip = set(skip)
+        self.truncate_above = truncate_above
+        self.batch_sizes = []
+        self.chat = _ns(completions=_ns(create=self._create))
+
+    async def _create(self, model, messages, **kwargs):
+        count = messages[-1]["content"].count("Profile ")
+        self.batch_sizes.append(count)
+        usage = _ns(prompt_tokens=10, completion_tokens=5)
+        if self.truncate_above is not None and count > self.truncate_above:
+            message = _ns(content='{"scores": [{"profile": 1, "ge', refusal=None)
+            return _ns(choices=[_ns(message=message, finish_reason="length")], usage=usage)
+        rows = [{"profile": j, "get": 7, "give": 6}
+                for j in range(1, count + 1) if j not in self.skip]
+        message = _ns(content=json.dumps({"scores": rows}), refusal=None)
+        return _ns(choices=[_ns(message=message, finish_reason="stop")], usage=usage)
+
+
+class ScoreAllBatchesCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.texts = {idx: f'{{"Bio":"person {idx}"}}' for idx in range(10)}
+
+    def score(self, client, cache):
+        async def run():
+            return await utils._score_all_batches(
+                self.texts, "me", client, ["deploy"], list(self.texts), len(self.texts),
+                chunk_size=10, cache_key="key", semaphore=asyncio.Semaphore(2),
+                progress_callback=None, status_messages=[], score_cache=cache)
+        return asyncio.run(run())
+
+    def test_missing_profiles_score_zero_but_are_not_cached(self):
+        cache = utils.ScoreCache(os.path.join(self.tmp.name, "scores.sqlite"))
+        self.addCleanup(cache.close)
+
+        get_scores, give_scores, _ = self.score(StubChatClient(skip={3}), cache)
+
+        self.assertEqual((get_scores[2], give_scores[2]), (0, 0))
+        self.assertEqual((get_scores[0], give_scores[0]), (7, 6))
+
+        get_scores, _, _ = self.score(StubChatClient(), cache)
+        self.assertEqual(get_scores[2], 7)
+
+    def test_duplicates_and_prefiltered_profiles(self):
+        cache = utils.ScoreCache(os.path.join(self.tmp.name, "scores.sqlite"))
+        self.addCleanup(cache.close)
+        texts = {0: "climate policy research", 1: "climate policy research",
+                 2: "knitting baking", 3: "climate modelling", 4: "gardening"}
+
+        def score(client, min_shared):
+            async def run():
+                return await utils._score_all_batches(
+                    texts, "climate policy", client, ["deploy"], list(texts), len(texts),
+                    chunk_size=10, cache_key="key", semaphore=asyncio.Semaphore(2),
+                    progress_callback=None, status_messages=[], score_cache=cache,
+                    min_shared_keywords=min_shared)
+            return asyncio.run(run())
+
+        client = StubChatClient()
+        get_scores, give_scores, _ = score(client, min_shared=1)
+
+        # Only 0 and 3 are sent; 1 copies 0's scores, 2 and 4 are prefiltered to 0
+        self.assertEqual(client.batch_sizes, [2])
+        self.assertEqual(get_scores, {0: 7, 1: 7, 2: 0, 3: 7, 4: 0})
+        self.assertEqual(give_scores, {0: 6, 1: 6, 2: 0, 3: 6, 4: 0})
+
+        # The prefilter's zeros weren't cached: without it, 2 and 4 are scored
+        client = StubChatClient()
+        get_scores, _, _ = score(client, min_shared=0)
+
+        self.assertEqual(client.batch_sizes, [2])
+        self.assertEqual(get_scores, {0: 7, 1: 7, 2: 7, 3: 7, 4: 7})
+
+
+class StubReportClient:
+    """Records the final-report prompt and returns a canned report."""
+
+    def __init__(self):
+        self.prompts = []
+        self.chat = _ns(completions=_ns(create=self._create))
+
+    async def _create(self, model, messages, **kwargs):
+        self.prompts.append(messages[-1]["content"])
+        message = _ns(content="### #1. Someone", refusal=None)
+        return _ns(choices=[_ns(message=message, finish_reason="stop")], usage=None)
+
+
+class GenerateFinalReportTest(unittest.TestCase):
+    def report(self, scores, max_candidates):
+        texts = {idx: f'{{"Name":"person-{idx}"}}' for idx in range(6)}
+        client = StubReportClient()
+        _, status, _ = asyncio.run(utils._generate_final_report(
+            texts, "Me", "my profile", client, "deploy", scores, "get_value",
+            min_score=8, additional_context=None, total_count=len(texts),
+            final_callback=None, max_candidates=max_candidates))
+        sent = [idx for idx in texts if f"person-{idx}" in client.prompts[0]]
+        return sent, status
+
+    def test_ties_at_the_cap_are_broken_by_corpus_order(self):
+        # Dict order mimics cache hits and batch completion, not the sheet
+        scores = {5: 9, 3: 9, 0: 10, 4: 9, 1: 2, 2: 9}
+
+        sent, _ = self.report(scores, max_candidates=3)
+
+        self.assertEqual(sent, [0, 2, 3])
+
+    def test_cap_reports_dropped_ties(self):
+        _, status = self.report({0: 10, 2: 9, 3: 9, 4: 9, 5: 9}, max_candidates=3)
+
+        self.assertIn("2 other profiles also scored 9", " ".join(status))
+
+    def test_no_tie_note_when_cap_falls_between_scores(self):
+        _, status = self.report({0: 10, 2: 9, 3: 8, 4: 8}, max_candidates=2)
+
+        self.assertNotIn("also scored", " ".join(status))
+
+
+class FindMatchesTest(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({"First Name": ["Ada", None, "Alan"],
+                                "Last Name": ["Lovelace", None, "Turing"]})
+
+    def test_exact_match_scores_100(self):
+        self.assertEqual(utils.find_matches(self.df, "ada LOVELACE"), [("Ada Lovelace", 100.0, 0)])
+
+    def test_query_without_letters_matches_nothing(self):
+        for name in (" ", " - ", "."):
+            self.assertEqual(utils.find_matches(self.df, name), [])
+
+
+class ScoreAllBatchesTruncationTest(unittest.TestCase):
+    def score(self, client, count, chunk_size):
+        texts = {idx: f'{{"Bio":"person {idx}"}}' for idx in range(count)}
+        progress, status = [], []
+
+        async def run():
+            return await utils._score_all_batches(
+                texts, "me", client, ["deploy"], list(texts), len(texts),
+                chunk_size=chunk_size, cache_key="key", semaphore=asyncio.Semaphore(2),
+                progress_callback=lambda *args: progress.append(args),
+                status_messages=status)
+        with mock.patch.object(utils, "_backoff_delay", return_value=0):
+            return asyncio.run(run()), progress, status
+
+    def test_truncated_batches_are_split_until_they_fit(self):
+        client = StubChatClient(truncate_above=3)
+
+        (get_scores, give_scores, usage), progress, status = self.score(client, 12, chunk_size=6)
+
+        self.assertEqual(get_scores, {idx: 7 for idx in range(12)})
+        self.assertEqual(give_scores, {idx: 6 for idx in range(12)})
+        # 2 batches of 6, each cut off once and scored as 3 + 3
+        self.assertEqual(sorted(client.batch_sizes), [3, 3, 3, 3, 6, 6])
+        self.assertEqual(progress[-1], (4, 4, "scoring"))
+        self.assertEqual([p[0] for p in progress], [1, 2, 3, 4])
+        self.assertIn("All 4 batches scored", status)
+        # Truncated calls are still billed
+        self.assertEqual(usage["prompt_tokens"], 60)
+        self.assertEqual(usage["completion_tokens"], 30)
+
+    def test_single_truncated_profile_fails_without_retrying(self):
+        client = StubChatClient(truncate_above=0)
+
+        with self.assertRaisesRegex(ValueError, "single profile"):
+            self.score(client, 2, chunk_size=2)
+        self.assertEqual(client.batch_sizes, [2, 1])
+
+
+class LowOverlapIndicesTest(unittest.TestCase):
+    def test_words_in_most_profiles_do_not_count_as_overlap(self):
+        texts = {0: "profile climate policy", 1: "profile knitting",
+                 2: "profile baking", 3: "profile gardening"}
+
+        skipped = utils._low_overlap_indices(texts, "profile climate", list(texts), 1)
+
+        self.assertEqual(skipped, [1, 2, 3])
+
+    def test_user_profile_without_distinctive_words_skips_nobody(self):
+        texts = {0: "profile climate", 1: "profile knitting", 2: "profile baking"}
+
+        self.assertEqual(utils._low_overlap_indices(texts, "Profile", list(texts), 1), [])
+
+    def test_threshold_is_the_minimum_number_of_shared_words(self):
+        texts = {0: "climate policy", 1: "climate knitting", 2: "baking gardening",
+                 3: "pottery", 4: "sailing"}
+
+        self.assertEqual(utils._low_overlap_indices(texts, "climate policy", list(texts), 2), [1, 2, 3, 4])
+        self.assertEqual(utils._low_overlap_indices(texts, "climate policy", list(texts), 1), [2, 3, 4])
+
+
+class LoadCsvTest(unittest.TestCase):
+    PREAMBLE = "Event export,,\nGenerated,,\n,,\nNotes,,\n"
+
+    def load(self, body):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as f:
+            f.write(self.PREAMBLE + body)
+        self.addCleanup(os.remove, f.name)
+        return utils.load_csv_from_url(f.name)[0]
+
+    def test_skips_preamble(self):
+        df = self.load("First Name,Last Name,Org\nAda,Lovelace,AE\nAlan,Turing,NPL\n")
+
+        self.assertEqual(list(df.columns), ["First Name", "Last Name", "Org"])
+        self.assertEqual(df["Last Name"].tolist(), ["Lovelace", "Turing"])
+
+    def test_repeated_headers_are_renamed_like_the_c_parser(self):
+        df = self.load("First Name,Org,Org\nAda,AE,Analytical Society\n")
+
+        self.assertEqual(list(df.columns), ["First Name", "Org", "Org.1"])
+        self.assertEqual(df["Org.1"].tolist(), ["Analytical Society"])
+
+
+if __name__ == "__main__":
+    unittest.main()
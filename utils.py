@@ -3,22 +3,42 @@ File: utils.py
 Purpose: Reusable functions for EA Global meeting matcher (Streamlit version)
 """
 
+import io
 import json
 import logging
 import os
 import re
 import random
+import time
 import hashlib
+import threading
+import urllib.request
+import sqlite3
 import asyncio
+from collections import Counter
+import numpy as np
 import pandas as pd
 from datetime import datetime
 from openai import AsyncAzureOpenAI, RateLimitError
+from openai.types import CompletionUsage
 
 # Max number of scoring requests in flight at once, shared across BOTH pipelines.
 # Without this cap, every batch from both directions fires simultaneously
 # (~76 concurrent requests) and overwhelms the Azure deployment with 429s.
 MAX_CONCURRENT_REQUESTS = 6
 
+# Most candidates sent to each final-report call. Every candidate's full profile
+# goes into that prompt, and the report only ranks 25, so ~3x that is plenty of
+# choice without sending hundreds of profiles when many score above the cutoff.
+MAX_FINAL_CANDIDATES = 75
+
+# Min seconds between partial-text updates while a final report streams in.
+STREAM_UPDATE_SECONDS = 0.25
+
+# Azure OpenAI Batch API polling (opt-in scoring path, see use_batch_api).
+BATCH_API_POLL_SECONDS = 5
+BATCH_API_TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
 # Assumed Azure pricing, USD per 1M tokens. NOTE: Azure does NOT return prices
 # in the API response — only token counts — so these are hardcoded. CONFIRM
 # against the official Azure OpenAI pricing page before trusting the dollars.
@@ -29,6 +49,79 @@ PRICING_PER_1M = {
 }
 
 
+class AsyncTokenBucket:
+    """Async token-bucket limiter: at most `rate` requests per `period` seconds.
+
+    Allows bursts of up to `rate` requests, then paces callers to the refill
+    rate, so a run stays under a deployment's RPM quota instead of bursting
+    into 429s and backing off.
+    """
+
+    def __init__(self, rate, period=60.0):
+        self.capacity = float(rate)
+        self.tokens = float(rate)
+        self.fill_rate = rate / period
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a token is available, then take it."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.fill_rate)
+
+
+class ScoreCache:
+    """SQLite-backed store of (get, give) scores that survives across runs.
+
+    Keyed on a hash of the scoring prompt version, the scoring deployment(s),
+    the user's profile and the candidate's profile, so a repeat run for the
+    same user only sends attendees who are new or whose profile changed.
+    Only the hashes and integer scores are stored, never profile text.
+    """
+
+    # Bump when the scoring prompt or scale changes, to retire old scores.
+    VERSION = 2
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS scores (key TEXT PRIMARY KEY, get INTEGER, give INTEGER)")
+
+    @classmethod
+    def key(cls, model, user_profile, profile_text):
+        raw = "\x00".join((str(cls.VERSION), model, user_profile, profile_text))
+        return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+    def get_many(self, keys):
+        """Return {key: (get, give)} for the keys that are cached."""
+        keys = list(keys)
+        found = {}
+        for i in range(0, len(keys), 500):  # stay under SQLite's bound-variable limit
+            chunk = keys[i:i + 500]
+            rows = self.conn.execute(
+                f"SELECT key, get, give FROM scores WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+            found.update((k, (g, v)) for k, g, v in rows)
+        return found
+
+    def put_many(self, items):
+        """Store {key: (get, give)}."""
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO scores (key, get, give) VALUES (?, ?, ?)",
+            [(k, g, v) for k, (g, v) in items.items()])
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
 def _empty_usage():
     """A fresh token accumulator."""
     return {"prompt_tokens": 0, "cached_tokens": 0,
@@ -73,9 +166,26 @@ logging.basicConfig(
     datefmt="%H:%M:%S",
 )
 log = logging.getLogger(__name__)
-from rapidfuzz import fuzz, process
+from rapidfuzz import fuzz, process, utils as fuzz_utils
 from markdown_to_mrkdwn import SlackMarkdownConverter
 
+# Optional: orjson serializes and parses several times faster. The stdlib
+# fallback emits the same compact, non-ASCII-preserving JSON, so profile
+# strings (and the score cache keys built from them) don't depend on which
+# one is installed.
+try:
+    import orjson
+
+    def _json_dumps(obj):
+        return orjson.dumps(obj).decode("utf-8")
+
+    _json_loads = orjson.loads
+except ImportError:
+    def _json_dumps(obj):
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+    _json_loads = json.loads
+
 
 
 def get_export_url(sheet_url):
@@ -84,9 +194,16 @@ def get_export_url(sheet_url):
     return f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv"
 
 
-def calculate_row_length(row):
-    """Calculate total character length of all values in a row."""
-    return sum(len(str(val)) for val in row if pd.notna(val))
+def calculate_row_lengths(df):
+    """Total character length of all non-missing values in each row.
+
+    Vectorized per column (Arrow string kernels) rather than a Python loop over
+    every cell of every row.
+    """
+    lengths = pd.Series(0, index=df.index, dtype="int64")
+    for col in df.columns:
+        lengths += df[col].astype("string[pyarrow]").str.len().fillna(0).astype("int64")
+    return lengths
 
 
 def load_csv_from_url(csv_url):
@@ -100,8 +217,48 @@ def load_csv_from_url(csv_url):
         Tuple of (DataFrame, status_message)
     """
     export_url = get_export_url(csv_url) if '/d/' in csv_url else csv_url
-    df = pd.read_csv(export_url, skiprows=4)
-    return df, f"Downloaded {len(df)} attendees from Google Sheets"
+    # Download once, so a parser fallback below doesn't fetch the sheet again
+    if export_url.startswith(("http://", "https://")):
+        with urllib.request.urlopen(export_url) as resp:
+            raw = resp.read()
+    else:
+        with open(export_url, "rb") as f:
+            raw = f.read()
+    # Arrow-backed columns: the vectorized .str ops (name search, Swapcard
+    # lookup) then run over contiguous Arrow buffers instead of object arrays.
+    # The pyarrow parser builds them directly (multithreaded, no object-dtype
+    # intermediate); the 4 preamble rows are skipped via header= because the
+    # pyarrow engine doesn't honor skiprows.
+    df = None
+    try:
+        df = pd.read_csv(io.BytesIO(raw), header=4, engine="pyarrow", dtype_backend="pyarrow")
+    except ValueError:
+        pass  # e.g. ragged preamble rows the pyarrow parser rejects
+    # The pyarrow engine keeps repeated header names as-is; the C engine
+    # renames them (Org, Org.1), which the per-row dicts rely on.
+    if df is None or df.columns.duplicated().any():
+        df = pd.read_csv(io.BytesIO(raw), skiprows=4).convert_dtypes(dtype_backend="pyarrow")
+    return categorize_repeated_columns(df), f"Downloaded {len(df)} attendees from Google Sheets"
+
+
+# Columns that get filled and concatenated (name search, Swapcard links), which
+# a Categorical doesn't allow without first adding the fill value as a category.
+CATEGORICAL_EXCLUDE_COLUMNS = ("First Name", "Last Name", "Swapcard")
+
+
+def categorize_repeated_columns(df, max_unique_ratio=0.5):
+    """Store text columns with mostly repeated values as categoricals, in place.
+
+    Country, org type, ticket type and the like repeat across hundreds of
+    attendees; as categoricals each distinct string is held once, which keeps
+    the cached frame (and every copy Streamlit unpickles from it) small.
+    """
+    for col in df.columns:
+        if col in CATEGORICAL_EXCLUDE_COLUMNS or not pd.api.types.is_string_dtype(df[col]):
+            continue
+        if df[col].nunique() <= max_unique_ratio * len(df):
+            df[col] = df[col].astype("category")
+    return df
 
 
 def filter_profiles(df, min_chars=300):
@@ -116,12 +273,28 @@ def filter_profiles(df, min_chars=300):
         Tuple of (filtered_df, original_count, filtered_count)
     """
     original_count = len(df)
-    row_lengths = df.apply(calculate_row_length, axis=1)
+    row_lengths = calculate_row_lengths(df)
     df_filtered = df[row_lengths >= min_chars]
     return df_filtered, original_count, len(df_filtered)
 
 
-def find_matches(df, name, limit=5):
+def build_name_choices(df):
+    """
+    Build the fuzzy-search corpus for find_matches.
+
+    Returns:
+        Tuple of (full_names, search_keys): display names and their search
+        keys (an object array, for vectorized exact lookup), both in positional
+        (df.iloc) order. Keys are normalized once here with RapidFuzz's
+        default_process (lowercase, punctuation to spaces), so searches don't
+        re-process every name.
+    """
+    full_names = (df['First Name'].fillna('') + ' ' + df['Last Name'].fillna('')).str.strip().tolist()
+    search_keys = np.array([fuzz_utils.default_process(n) for n in full_names], dtype=object)
+    return full_names, search_keys
+
+
+def find_matches(df, name, limit=5, name_choices=None):
     """
     Find person by name using fuzzy matching.
 
@@ -129,18 +302,41 @@ def find_matches(df, name, limit=5):
         df: DataFrame with attendee data
         name: Name to search for
         limit: Number of matches to return
+        name_choices: Optional precomputed build_name_choices(df), so repeated
+            searches don't rebuild the name corpus
 
     Returns:
         List of tuples: [(matched_name, score, idx), ...]
     """
-    full_names = (df['First Name'].fillna('') + ' ' + df['Last Name'].fillna('')).tolist()
-    matches = process.extract(name, full_names, scorer=fuzz.ratio, limit=limit)
-    return matches if matches else []
+    full_names, search_keys = name_choices if name_choices is not None else build_name_choices(df)
+    query = fuzz_utils.default_process(name)
+    if not query:
+        # Only spaces/punctuation: would "exactly" match every blank name
+        return []
+
+    # Most people type their name correctly; skip the fuzzy scan on an exact hit.
+    exact = np.flatnonzero(search_keys == query)
+    if exact.size:
+        return [(full_names[idx], 100.0, int(idx)) for idx in exact[:limit]]
+
+    matches = process.extract(query, search_keys, scorer=fuzz.WRatio,
+                              limit=limit, score_cutoff=50)
+    return [(full_names[idx], score, idx) for _, score, idx in matches]
+
+
+def _records(df):
+    """Rows as plain dicts with every missing value (NaN, NA, None) as None.
+
+    One vectorized notna() pass, so per-row formatters only need an
+    `is not None` check instead of calling pd.notna on every cell.
+    """
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
 
 
 def format_row_as_pipe_delimited(row):
-    """Format a DataFrame row as pipe-delimited string."""
-    return '|'.join(str(val) if pd.notna(val) else '' for val in row.values)
+    """Format a row (Series or column -> value dict) as pipe-delimited string."""
+    values = row.values() if isinstance(row, dict) else row.values
+    return '|'.join(str(val) if pd.notna(val) else '' for val in values)
 
 
 # Columns whose names contain any of these substrings (case-insensitive) are
@@ -166,29 +362,71 @@ def _include_field_for_llm(col):
     return not any(sub in name for sub in LLM_PROFILE_EXCLUDE_SUBSTRINGS)
 
 
+def _profile_json(record):
+    """Serialize a {column: value-or-None} record, skipping blank values."""
+    profile = {}
+    for col, val in record.items():
+        if val is not None:
+            text = str(val).strip()
+            if text:
+                profile[col] = text
+    return _json_dumps(profile)
+
+
+def _llm_records(df):
+    """Rows as dicts of only the LLM columns, with every missing value as None.
+
+    The column filter and the missing-value check run once per column here
+    instead of once per cell in the formatter.
+    """
+    return _records(df[[col for col in df.columns if _include_field_for_llm(col)]])
+
+
 def format_profile_for_llm(row):
-    """Format a DataFrame row as a labeled JSON object for LLM consumption.
+    """Format a row (Series or column -> value dict) as labeled JSON for the LLM.
 
     Low-value/admin columns (see LLM_PROFILE_EXCLUDE_SUBSTRINGS) are omitted to
     save tokens — they don't help matching and are sent for thousands of
     profiles, twice (scoring + final round).
     """
-    profile = {}
-    for col, val in row.items():
-        if not _include_field_for_llm(col):
-            continue
-        if pd.notna(val) and str(val).strip():
-            profile[col] = str(val).strip()
-    return json.dumps(profile, ensure_ascii=False)
+    return _profile_json({col: (val if pd.notna(val) else None)
+                          for col, val in row.items() if _include_field_for_llm(col)})
+
+
+def build_profile_corpus(df):
+    """Map each DataFrame index to its format_profile_for_llm() JSON string.
+
+    Built once per dataset and reused for every run: each profile's JSON is
+    otherwise re-serialized on every Generate click (scoring + final round).
+    """
+    return {idx: _profile_json(record) for idx, record in zip(df.index, _llm_records(df))}
+
+
+def _profile_markdown(record):
+    """Markdown for a {column: value-or-None} record, skipping blank values."""
+    return "\n\n".join(f"**{col}:**\n{val}" for col, val in record.items()
+                       if val is not None and str(val).strip())
 
 
 def format_profile_display(row):
-    """Format a DataFrame row for nice display in Streamlit."""
-    fields = []
-    for col, val in row.items():
-        if pd.notna(val) and str(val).strip():
-            fields.append(f"**{col}:**\n{val}")
-    return "\n\n".join(fields)
+    """Format a row (Series or column -> value dict) for display in Streamlit."""
+    return _profile_markdown({col: (val if pd.notna(val) else None) for col, val in row.items()})
+
+
+def build_profile_strings(df):
+    """Display and LLM strings for every row, as object arrays in df.iloc order.
+
+    Built once per dataset so showing the selected profile, building the user's
+    prompt and assembling the scoring corpus are plain array lookups.
+    """
+    display = np.empty(len(df), dtype=object)
+    llm = np.empty(len(df), dtype=object)
+    # Plain dicts: iterrows() would build a Series for every row
+    for pos, record in enumerate(_records(df)):
+        display[pos] = _profile_markdown(record)
+    for pos, record in enumerate(_llm_records(df)):
+        llm[pos] = _profile_json(record)
+    return display, llm
 
 
 DIRECTION_SCORING = {
@@ -230,17 +468,17 @@ DIRECTION_FINAL = {
 }
 
 
-def create_scoring_prompt(user_profile, numbered_profiles, total_count):
-    """Create the COMBINED scoring prompt for a batch of profiles.
+def create_scoring_system_prompt(user_profile, total_count):
+    """Create the system message shared by every scoring batch in a run.
 
     Scores every attendee on BOTH directions in a single call ("get" = value for
     me, "give" = value I provide to them), so each profile is sent once instead
     of twice.
 
-    Caching note: the static instruction block + the user's own profile come
-    FIRST and contain no per-batch variables (only run-constant total_count), so
-    they form a byte-identical prefix that Azure prompt caching can reuse across
-    every batch. Keep all per-batch content (the profiles) strictly after it.
+    Caching note: the instructions + the user's own profile contain no per-batch
+    variables (only run-constant total_count), so this message is a
+    byte-identical prefix that Azure prompt caching reuses across every batch.
+    All per-batch content goes in the user message (create_scoring_prompt).
     """
     get = DIRECTION_SCORING["get_value"]
     give = DIRECTION_SCORING["give_value"]
@@ -276,19 +514,20 @@ SCORING SCALE (be strict — most people should score 4-6):
 - 1-3: Weak or no relevant connection.
 
 MY PROFILE:
-{user_profile}
+{user_profile}"""
 
----
 
-ATTENDEE PROFILES TO SCORE:
+def create_scoring_prompt(numbered_profiles):
+    """Create the per-batch user message: the numbered profiles to score."""
+    return f"""ATTENDEE PROFILES TO SCORE:
 
 {numbered_profiles}
 
 ---
 
-Return a JSON object mapping each profile number to an object with "get" and "give" integer scores.
-Example: {{"1": {{"get": 7, "give": 4}}, "2": {{"get": 9, "give": 8}}}}
-Score every profile listed above on BOTH dimensions. Return ONLY valid JSON, nothing else."""
+Return a JSON object whose "scores" list has one entry per profile: its number plus "get" and "give" integer scores.
+Example: {{"scores": [{{"profile": 1, "get": 7, "give": 4}}, {{"profile": 2, "get": 9, "give": 8}}]}}
+Score every profile listed above on BOTH dimensions."""
 
 
 def create_final_prompt(user_name, user_profile, scored_profiles_text, top_count, total_count,
@@ -338,7 +577,11 @@ Rules:
 def _retry_after_seconds(err):
     """Extract a Retry-After delay (seconds) from a RateLimitError, if provided."""
     try:
-        value = err.response.headers.get("retry-after")
+        headers = err.response.headers
+        value_ms = headers.get("retry-after-ms")
+        if value_ms is not None:
+            return float(value_ms) / 1000
+        value = headers.get("retry-after")
         if value is not None:
             return float(value)
     except Exception:
@@ -346,6 +589,56 @@ def _retry_after_seconds(err):
     return None
 
 
+def _is_retryable(err):
+    """False for client errors (4xx other than 408/409/429) a retry can't fix."""
+    status = getattr(err, "status_code", None)
+    return not (status and 400 <= status < 500 and status not in (408, 409, 429))
+
+
+def _backoff_delay(err, attempt):
+    """Seconds to wait before retry number attempt + 1.
+
+    Exponential backoff with jitter so concurrent retries don't all fire at
+    once; on a 429, the server's Retry-After is honored when present.
+    """
+    if isinstance(err, RateLimitError):
+        retry_after = _retry_after_seconds(err)
+        if retry_after is not None:
+            return retry_after + random.uniform(0, 2)
+    return min(60, 5 * (2 ** attempt)) + random.uniform(0, 3)
+
+
+# Structured output for the scoring pass: the deployment is constrained to this
+# schema, so responses always parse and carry nothing but the scores.
+SCORING_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "profile_scores",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "scores": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "profile": {"type": "integer"},
+                            "get": {"type": "integer"},
+                            "give": {"type": "integer"},
+                        },
+                        "required": ["profile", "get", "give"],
+                        "additionalProperties": False,
+                    },
+                },
+            },
+            "required": ["scores"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+
 def _coerce_scores(obj):
     """Pull integer (get, give) scores out of one profile's JSON value.
 
@@ -370,137 +663,402 @@ def _coerce_scores(obj):
     return g, v
 
 
-async def _score_all_batches(df_filtered, user_profile, client, deployment, indices,
+async def _run_scoring_batch_job(client, deployment, message_lists, cache_key, status_messages):
+    """Submit scoring requests as one Azure OpenAI Batch API job and wait for it.
+
+    Batch jobs trade queue time for throughput and cheaper tokens, so this is
+    only used for the scoring pass — never for the final reports the user is
+    actively waiting on. Requires a Global-Batch deployment.
+
+    Returns a dict mapping 1-based batch number -> (response_text, usage) for
+    every request that succeeded. Missing entries should be scored live.
+    """
+    lines = []
+    for batch_num, messages in enumerate(message_lists, 1):
+        lines.append(_json_dumps({
+            "custom_id": f"batch-{batch_num}",
+            "method": "POST",
+            "url": "/chat/completions",
+            "body": {
+                "model": deployment,
+                "messages": messages,
+                "response_format": SCORING_RESPONSE_FORMAT,
+                "user": cache_key,
+            },
+        }))
+    input_file = await client.files.create(
+        file=("scoring_batches.jsonl", "\n".join(lines).encode("utf-8")),
+        purpose="batch",
+    )
+    job = await client.batches.create(
+        input_file_id=input_file.id,
+        endpoint="/chat/completions",
+        completion_window="24h",
+    )
+    status_messages.append(f"Submitted {len(message_lists)} scoring requests as Batch API job {job.id}")
+    log.info(f"[scoring] Batch API job {job.id} submitted ({len(message_lists)} requests)")
+
+    while job.status not in BATCH_API_TERMINAL_STATUSES:
+        await asyncio.sleep(BATCH_API_POLL_SECONDS)
+        job = await client.batches.retrieve(job.id)
+    log.info(f"[scoring] Batch API job {job.id} finished with status {job.status}")
+
+    outputs = {}
+    if not job.output_file_id:
+        status_messages.append(f"Batch API job ended with status '{job.status}' and no output")
+        return outputs
+
+    content = await client.files.content(job.output_file_id)
+    for line in content.text.splitlines():
+        if not line.strip():
+            continue
+        record = _json_loads(line)
+        response = record.get("response") or {}
+        if response.get("status_code") != 200:
+            continue
+        body = response.get("body") or {}
+        try:
+            text = body["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError):
+            continue
+        usage = CompletionUsage.model_validate(body["usage"]) if body.get("usage") else None
+        outputs[int(record["custom_id"].split("-")[1])] = (text, usage)
+    return outputs
+
+
+_KEYWORD_RE = re.compile(r"[a-z0-9]{4,}")
+
+
+def _low_overlap_indices(profile_texts, user_profile, indices, min_shared):
+    """Indices whose profile shares fewer than min_shared keywords with the user's.
+
+    Keywords are words of 4+ characters, minus any word found in over half of
+    the profiles (column names, boilerplate), so the JSON structure every
+    profile shares doesn't count as overlap.
+    """
+    keywords = {idx: set(_KEYWORD_RE.findall(profile_texts[idx].lower())) for idx in indices}
+    doc_freq = Counter(word for words in keywords.values() for word in words)
+    common = {word for word, n in doc_freq.items() if n > len(indices) / 2}
+    user_words = set(_KEYWORD_RE.findall(user_profile.lower())) - common
+    if not user_words:
+        return []  # nothing distinctive to compare against; score everyone
+    return [idx for idx, words in keywords.items() if len(user_words & words) < min_shared]
+
+
+async def _score_all_batches(profile_texts, user_profile, client, deployments, indices,
                              total_count, chunk_size, cache_key, semaphore,
-                             progress_callback, status_messages):
+                             progress_callback, status_messages, use_batch_api=False,
+                             rate_limiter=None, score_cache=None, min_shared_keywords=0):
     """Score every profile ONCE on both directions ("get" and "give").
 
+    Batches are spread round-robin across `deployments` (each Azure deployment
+    has its own TPM quota), and a retry moves on to the next deployment so one
+    throttled deployment doesn't stall its batches.
+
+    With use_batch_api, all batches go out as a single Batch API job on the
+    first deployment and only the ones that job fails to return are retried live.
+
+    With a score_cache, profiles already scored for this user (same profile
+    text, same deployments) are reused and only the misses are batched.
+
+    Profiles with identical text (e.g. duplicate registrations) are scored once
+    and the result is copied to every duplicate.
+
+    With min_shared_keywords, profiles sharing fewer keywords than that with
+    the user's profile are scored 0 locally instead of being sent to the model.
+
     Returns (get_scores, give_scores, stage1_usage). Each *_scores maps a
     DataFrame index to an integer score for that dimension.
     """
+    first_with_text, duplicates = {}, {}
+    for idx in indices:
+        first = first_with_text.setdefault(profile_texts[idx], idx)
+        if first != idx:
+            duplicates[idx] = first
+    if duplicates:
+        indices = [idx for idx in indices if idx not in duplicates]
+        status_messages.append(f"Skipped {len(duplicates)} duplicate profiles (scored once)")
+
+    unrelated = []
+    if min_shared_keywords:
+        unrelated = _low_overlap_indices(profile_texts, user_profile, indices, min_shared_keywords)
+        if unrelated:
+            unrelated_set = set(unrelated)
+            indices = [idx for idx in indices if idx not in unrelated_set]
+            status_messages.append(f"Skipped {len(unrelated)} profiles with too little keyword "
+                                   f"overlap (min {min_shared_keywords} shared, scored 0)")
+
+    cached, cache_keys = {}, {}
+    if score_cache is not None:
+        model = ",".join(sorted(deployments))
+        cache_keys = {idx: ScoreCache.key(model, user_profile, profile_texts[idx]) for idx in indices}
+        hits = score_cache.get_many(cache_keys.values())
+        cached = {idx: hits[k] for idx, k in cache_keys.items() if k in hits}
+        if cached:
+            indices = [idx for idx in indices if idx not in cached]
+            status_messages.append(f"Reused cached scores for {len(cached)} profiles")
+
     batches = [indices[i:i + chunk_size] for i in range(0, len(indices), chunk_size)]
     num_batches = len(batches)
-    status_messages.append(
-        f"Scoring {len(indices)} profiles in {num_batches} batches of ~{chunk_size} "
-        f"(both directions per call)..."
-    )
+    if num_batches:
+        status_messages.append(
+            f"Scoring {len(indices)} profiles in {num_batches} batches of ~{chunk_size} "
+            f"(both directions per call)..."
+        )
 
     MAX_ATTEMPTS = 6
+    MAX_MISSING_FRACTION = 0.2  # retry a batch only if more than this is unscored
+
+    system_prompt = create_scoring_system_prompt(user_profile, total_count)
+
+    def build_messages(batch_indices):
+        """Shared system prompt plus this batch's numbered profiles."""
+        numbered_text = "\n".join(
+            f"Profile {j}: {profile_texts[idx]}" for j, idx in enumerate(batch_indices, 1))
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": create_scoring_prompt(numbered_text)},
+        ]
+
+    def parse_scores(text, batch_indices, batch_num):
+        """Map each DataFrame index in the batch to its (get, give) scores.
+
+        A few missing profiles are tolerated (scored 0) rather than paying for
+        a full retry; only a mostly-incomplete reply raises to retry the batch.
+        Returns (scores, missing_indices) so the placeholder zeros for missing
+        profiles are never persisted to the score cache.
+        """
+        if not text:
+            raise ValueError(f"Empty response for batch {batch_num}")
+        by_number = {row.get("profile"): row for row in _json_loads(text).get("scores", [])
+                     if isinstance(row, dict)}
+        missing = [idx for j, idx in enumerate(batch_indices, 1) if j not in by_number]
+        if len(missing) > MAX_MISSING_FRACTION * len(batch_indices):
+            raise ValueError(f"Batch {batch_num} response is missing {len(missing)} of "
+                             f"{len(batch_indices)} profiles")
+        if missing:
+            log.info(f"[scoring] Batch {batch_num}: {len(missing)} profiles missing, scored 0")
+        scores = {idx: _coerce_scores(by_number.get(j, {}))
+                  for j, idx in enumerate(batch_indices, 1)}
+        return scores, missing
 
     async def score_one_batch(batch_indices, batch_num):
         """Score a single batch on both dimensions, with retries on failure."""
-        numbered_lines = []
-        for j, idx in enumerate(batch_indices, 1):
-            profile_json = format_profile_for_llm(df_filtered.loc[idx])
-            numbered_lines.append(f"Profile {j}: {profile_json}")
-        numbered_text = "\n".join(numbered_lines)
-        prompt = create_scoring_prompt(user_profile, numbered_text, total_count)
+        messages = build_messages(batch_indices)
 
         for attempt in range(MAX_ATTEMPTS):
             try:
+                deployment = deployments[(batch_num - 1 + attempt) % len(deployments)]
                 async with semaphore:
+                    if rate_limiter:
+                        await rate_limiter.acquire()
                     response = await client.chat.completions.create(
                         model=deployment,
-                        messages=[{"role": "user", "content": prompt}],
-                        response_format={"type": "json_object"},
+                        messages=messages,
+                        response_format=SCORING_RESPONSE_FORMAT,
                         # Routing hint so all batches in a run pin to the same
                         # backend and reuse the warmed prompt-cache prefix.
                         user=cache_key,
                     )
 
-                text = response.choices[0].message.content
-                if not text:
-                    raise ValueError(f"Empty response for batch {batch_num}")
-
-                scores = json.loads(text)
-                result = {}
-                for j, idx in enumerate(batch_indices, 1):
-                    result[idx] = _coerce_scores(scores.get(str(j), scores.get(j, {})))
-                return result, batch_num, response.usage
+                choice = response.choices[0]
+                if choice.finish_reason == "length":
+                    # Cut off at the output-token cap: a retry of the same
+                    # batch would be too, so the caller splits it instead.
+                    return None, [], batch_num, response.usage
+                scores, missing = parse_scores(choice.message.content, batch_indices, batch_num)
+                return scores, missing, batch_num, response.usage
 
             except Exception as e:
-                if attempt >= MAX_ATTEMPTS - 1:
+                if attempt >= MAX_ATTEMPTS - 1 or not _is_retryable(e):
                     raise ValueError(f"Batch {batch_num} failed after {attempt + 1} attempts: {e}")
 
-                # Exponential backoff with jitter so retries don't all fire at once.
-                # On a 429, honor the server's Retry-After header when present.
-                delay = min(60, 5 * (2 ** attempt)) + random.uniform(0, 3)
+                delay = _backoff_delay(e, attempt)
                 if isinstance(e, RateLimitError):
-                    retry_after = _retry_after_seconds(e)
-                    if retry_after is not None:
-                        delay = retry_after + random.uniform(0, 2)
-                    log.info(f"[scoring] Batch {batch_num} rate-limited "
+                    log.info(f"[scoring] Batch {batch_num} rate-limited on {deployment} "
                              f"(attempt {attempt + 1}/{MAX_ATTEMPTS}), waiting {delay:.1f}s")
                 await asyncio.sleep(delay)
 
     results = []
+    truncated_usage = []
 
     def _record(r):
         results.append(r)
+        if score_cache is not None:
+            # Persist as we go so a failed run still keeps what it paid for.
+            # Profiles the model skipped are 0 for this run only, not cached.
+            scores, missing = r[0], set(r[1])
+            score_cache.put_many({cache_keys[idx]: gv for idx, gv in scores.items()
+                                  if idx not in missing})
         if progress_callback:
             progress_callback(len(results), num_batches, "scoring")
 
-    # Warm the prompt cache: run the FIRST batch alone to completion so the
-    # large shared prefix (instructions + user profile) gets cached, THEN fan
-    # the rest out concurrently to hit that warm cache. Firing everything at
-    # once races a cold cache and caches almost nothing.
+    async def score_and_record(batch_indices, batch_num):
+        """Score one batch; if its reply was truncated, score each half instead."""
+        nonlocal num_batches
+        result, _, _, usage = r = await score_one_batch(batch_indices, batch_num)
+        if result is not None:
+            _record(r)
+            return
+        truncated_usage.append(usage)
+        if len(batch_indices) == 1:
+            # Nothing left to split, and retries would just be cut off again
+            raise ValueError(f"Batch {batch_num}: the reply for a single profile "
+                             f"hit the output-token limit")
+        num_batches += 1
+        half = len(batch_indices) // 2
+        log.info(f"[scoring] Batch {batch_num} hit the output-token limit, "
+                 f"splitting into {half} + {len(batch_indices) - half} profiles")
+        await score_and_record(batch_indices[:half], batch_num)
+        await score_and_record(batch_indices[half:], batch_num)
+
     try:
-        if batches:
-            _record(await score_one_batch(batches[0], 1))
-        rest = [asyncio.ensure_future(score_one_batch(b, i + 2))
-                for i, b in enumerate(batches[1:])]
-        for coro in asyncio.as_completed(rest):
-            _record(await coro)
+        if use_batch_api and batches:
+            outputs = await _run_scoring_batch_job(
+                client, deployments[0], [build_messages(b) for b in batches], cache_key, status_messages)
+            live = []
+            for batch_num, batch_indices in enumerate(batches, 1):
+                text, usage = outputs.get(batch_num, (None, None))
+                try:
+                    _record((*parse_scores(text, batch_indices, batch_num), batch_num, usage))
+                except ValueError:  # includes json.JSONDecodeError
+                    live.append((batch_indices, batch_num))
+            if live:
+                status_messages.append(f"{len(live)} batches missing from Batch API output, scoring them live")
+        else:
+            # Warm the prompt cache: run the FIRST batch alone to completion so the
+            # large shared prefix (instructions + user profile) gets cached, THEN fan
+            # the rest out concurrently to hit that warm cache. Firing everything at
+            # once races a cold cache and caches almost nothing.
+            if batches:
+                await score_and_record(batches[0], 1)
+            live = [(b, i + 2) for i, b in enumerate(batches[1:])]
+
+        # A TaskGroup cancels the remaining batches as soon as one fails for
+        # good, instead of leaving them running (and billing) in the background.
+        try:
+            async with asyncio.TaskGroup() as tg:
+                for batch_indices, batch_num in live:
+                    tg.create_task(score_and_record(batch_indices, batch_num))
+        except ExceptionGroup as eg:
+            raise eg.exceptions[0]
     except Exception as e:
         status_messages.append(f"Scoring failed: {e}")
         raise
 
-    status_messages.append(f"All {num_batches} batches scored")
+    if num_batches:
+        status_messages.append(f"All {num_batches} batches scored")
 
-    get_scores, give_scores = {}, {}
+    get_scores = {idx: g for idx, (g, _) in cached.items()}
+    give_scores = {idx: v for idx, (_, v) in cached.items()}
     stage1_usage = _empty_usage()
-    for batch_result, _, batch_usage in results:
+    for batch_result, _, _, batch_usage in results:
         for idx, (g, v) in batch_result.items():
             get_scores[idx] = g
             give_scores[idx] = v
         _add_usage(stage1_usage, batch_usage)
+    for usage in truncated_usage:
+        _add_usage(stage1_usage, usage)
+    for idx in unrelated:
+        get_scores[idx] = give_scores[idx] = 0
+    for idx, first in duplicates.items():
+        get_scores[idx] = get_scores[first]
+        give_scores[idx] = give_scores[first]
 
     return get_scores, give_scores, stage1_usage
 
 
-async def _generate_final_report(df_filtered, user_name, user_profile, client, deployment,
+async def _stream_final_completion(client, deployment, prompt, on_text):
+    """Stream one final-report completion, reporting the text as it grows.
+
+    on_text gets the accumulated text at most every STREAM_UPDATE_SECONDS.
+    Returns (text, finish_reason, refusal, usage).
+    """
+    stream = await client.chat.completions.create(
+        model=deployment,
+        messages=[{"role": "user", "content": prompt}],
+        stream=True,
+        # Token usage only arrives (on a final, choice-less chunk) if asked for.
+        stream_options={"include_usage": True},
+    )
+    parts, refusal_parts = [], []
+    finish_reason = usage = None
+    last_update = 0.0
+    async for chunk in stream:
+        if chunk.usage is not None:
+            usage = chunk.usage
+        if not chunk.choices:
+            continue
+        choice = chunk.choices[0]
+        if choice.delta is not None:
+            if choice.delta.content:
+                parts.append(choice.delta.content)
+            if getattr(choice.delta, 'refusal', None):
+                refusal_parts.append(choice.delta.refusal)
+        if choice.finish_reason:
+            finish_reason = choice.finish_reason
+        now = time.monotonic()
+        if parts and now - last_update >= STREAM_UPDATE_SECONDS:
+            last_update = now
+            on_text("".join(parts))
+    return "".join(parts), finish_reason, "".join(refusal_parts) or None, usage
+
+
+async def _generate_final_report(profile_texts, user_name, user_profile, client, deployment,
                                  scores, direction, min_score, additional_context,
-                                 total_count, final_callback):
+                                 total_count, final_callback, report_callback=None,
+                                 stream_callback=None, rate_limiter=None,
+                                 max_candidates=MAX_FINAL_CANDIDATES):
     """Filter to top-scoring profiles for one direction and generate its report.
 
+    At most max_candidates of the highest scorers are sent to the final call.
+
+    report_callback, if given, is called with (direction, text) as soon as this
+    direction's report is ready, without waiting for the other direction.
+    stream_callback, if given, switches the final call to streaming and is
+    called with (direction, partial_text) as the report is written.
+
     Returns (recommendations_text, status_messages, stage2_usage).
     """
     direction_label = "GET value" if direction == "get_value" else "GIVE value"
     status_messages = [f"=== {direction_label} ==="]
 
-    # Score distribution stats (for the UI bar charts)
-    for score_val in range(10, 0, -1):
-        count = sum(1 for s in scores.values() if s == score_val)
-        if count > 0:
-            status_messages.append(f"  Score {score_val}: {count} profiles")
+    # Scores in corpus (df_filtered) order: `scores` itself is ordered by cache
+    # hits and batch completion, which would make tie order vary between runs.
+    idx_list = [idx for idx in profile_texts if idx in scores]
+    score_arr = np.fromiter((scores[idx] for idx in idx_list), dtype=np.int64, count=len(idx_list))
 
-    top_items = [
-        (idx, score) for idx, score
-        in sorted(scores.items(), key=lambda x: x[1], reverse=True)
-        if score >= min_score
-    ]
-    status_messages.append(f"{len(top_items)} profiles scored {min_score}+ (sending to final round)")
+    # Score distribution stats (for the UI bar charts), counted in one pass
+    counts = np.bincount(score_arr[(score_arr >= 1) & (score_arr <= 10)], minlength=11)
+    for score_val in range(10, 0, -1):
+        if counts[score_val]:
+            status_messages.append(f"  Score {score_val}: {counts[score_val]} profiles")
+
+    # Filter before sorting: only the few profiles above the cutoff get ordered.
+    # Stable on the negated scores, so tied profiles stay in corpus order.
+    above = np.flatnonzero(score_arr >= min_score)
+    order = above[np.argsort(-score_arr[above], kind="stable")]
+    top_items = [(idx_list[pos], int(score_arr[pos])) for pos in order]
+    if max_candidates and len(top_items) > max_candidates:
+        status_messages.append(f"{len(top_items)} profiles scored {min_score}+ "
+                               f"(sending the top {max_candidates} to final round)")
+        # The cut can land inside a tied score group; which of those go is
+        # decided by sheet order (above), so say how many ties were left out.
+        cutoff_score = top_items[max_candidates - 1][1]
+        dropped_ties = sum(1 for _, score in top_items[max_candidates:] if score == cutoff_score)
+        if dropped_ties:
+            status_messages.append(f"  {dropped_ties} other profiles also scored {cutoff_score} "
+                                   f"and were left out (ties kept in sheet order)")
+        top_items = top_items[:max_candidates]
+    else:
+        status_messages.append(f"{len(top_items)} profiles scored {min_score}+ (sending to final round)")
 
     if not top_items:
         raise ValueError(f"No profiles scored {min_score}+ for {direction_label}. "
                          f"Try lowering the threshold.")
 
     # Format top profiles with their scores for the final prompt
-    scored_lines = []
-    for idx, score in top_items:
-        profile_json = format_profile_for_llm(df_filtered.loc[idx])
-        scored_lines.append(f"[Score: {score}] {profile_json}")
-    scored_text = "\n".join(scored_lines)
+    scored_text = "\n".join(f"[Score: {score}] {profile_texts[idx]}" for idx, score in top_items)
 
     status_messages.append(f"Generating final top 25 from {len(top_items)} candidates...")
     if final_callback:
@@ -513,41 +1071,72 @@ async def _generate_final_report(df_filtered, user_name, user_profile, client, d
              f"{len(top_items)} candidates")
 
     stage2_usage = _empty_usage()
-    backoff_delays = [5, 10, 20]
-    for attempt in range(3):
+    MAX_ATTEMPTS = 3
+    for attempt in range(MAX_ATTEMPTS):
         try:
-            log.info(f"[{direction_label}] Final call attempt {attempt + 1}/3 — sending to Azure...")
-            final_response = await client.chat.completions.create(
-                model=deployment,
-                messages=[{"role": "user", "content": final_prompt}],
-            )
-            log.info(f"[{direction_label}] Got response. Finish reason: {final_response.choices[0].finish_reason}")
-            log.info(f"[{direction_label}] Usage: {final_response.usage}")
-            text = final_response.choices[0].message.content
+            log.info(f"[{direction_label}] Final call attempt {attempt + 1}/{MAX_ATTEMPTS} — sending to Azure...")
+            if rate_limiter:
+                await rate_limiter.acquire()
+            if stream_callback:
+                text, finish_reason, refusal, usage = await _stream_final_completion(
+                    client, deployment, final_prompt,
+                    lambda partial: stream_callback(direction, partial))
+            else:
+                final_response = await client.chat.completions.create(
+                    model=deployment,
+                    messages=[{"role": "user", "content": final_prompt}],
+                )
+                choice = final_response.choices[0]
+                text, finish_reason, usage = choice.message.content, choice.finish_reason, final_response.usage
+                refusal = getattr(choice.message, 'refusal', None)
+            log.info(f"[{direction_label}] Got response. Finish reason: {finish_reason}")
+            log.info(f"[{direction_label}] Usage: {usage}")
             if not text:
-                refusal = getattr(final_response.choices[0].message, 'refusal', None)
                 log.info(f"[{direction_label}] Empty content! Refusal: {refusal}")
-                raise ValueError(f"Empty response (finish_reason={final_response.choices[0].finish_reason}, refusal={refusal})")
+                raise ValueError(f"Empty response (finish_reason={finish_reason}, refusal={refusal})")
             log.info(f"[{direction_label}] Success! Response length: {len(text)} chars")
             status_messages.append("Final recommendations generated")
-            _add_usage(stage2_usage, final_response.usage)
+            _add_usage(stage2_usage, usage)
+            if report_callback:
+                report_callback(direction, text)
             return text, status_messages, stage2_usage
         except Exception as e:
             log.info(f"[{direction_label}] Final call error (attempt {attempt + 1}): {type(e).__name__}: {e}")
-            if attempt < 2:
-                status_messages.append(f"Final call failed, retrying in {backoff_delays[attempt]}s...")
-                await asyncio.sleep(backoff_delays[attempt])
+            if attempt < MAX_ATTEMPTS - 1 and _is_retryable(e):
+                delay = _backoff_delay(e, attempt)
+                status_messages.append(f"Final call failed, retrying in {delay:.0f}s...")
+                await asyncio.sleep(delay)
             else:
                 status_messages.append(f"Final recommendation failed: {e}")
                 raise
 
 
+def create_azure_client(azure_api_key, azure_endpoint, azure_api_version="2024-12-01-preview"):
+    """Build the async Azure OpenAI client used for every pipeline call.
+
+    The client holds an HTTP connection pool, so callers that run the pipeline
+    repeatedly should build it once and pass it in via `client=` (all runs must
+    then share one event loop, since the pool is bound to it).
+    """
+    return AsyncAzureOpenAI(
+        api_key=azure_api_key,
+        azure_endpoint=azure_endpoint,
+        api_version=azure_api_version,
+    )
+
+
 async def run_dual_matching_pipeline(df_filtered, user_name, user_profile,
                                      azure_api_key, azure_endpoint, azure_deployment,
                                      azure_api_version="2024-12-01-preview",
                                      chunk_size=50, min_score=8, additional_context=None,
                                      user_idx=None, progress_callback=None,
-                                     final_callback=None):
+                                     final_callback=None, report_callback=None,
+                                     max_concurrent=MAX_CONCURRENT_REQUESTS,
+                                     use_batch_api=False, scoring_deployments=None,
+                                     client=None, profile_texts=None, stream_callback=None,
+                                     requests_per_minute=None, score_cache_path=None,
+                                     max_final_candidates=MAX_FINAL_CANDIDATES,
+                                     min_shared_keywords=0, rate_limiter=None):
     """
     Run the full matching flow:
       Stage 1: score every profile ONCE on both directions (combined prompt).
@@ -562,6 +1151,37 @@ async def run_dual_matching_pipeline(df_filtered, user_name, user_profile,
             after each scoring batch. There is now ONE scoring pass for both
             directions, so total_batches == ceil(num_profiles / chunk_size).
         final_callback: Called with (direction) when a final report starts.
+        report_callback: Called with (direction, text) as soon as each final
+            report is ready, so the UI can show one while the other finishes.
+        stream_callback: If given, final reports are streamed and this is
+            called with (direction, partial_text) as each one is written.
+        requests_per_minute: Optional RPM quota for the deployment. Calls are
+            paced with a token bucket to stay under it rather than relying on
+            429 retries alone.
+        rate_limiter: Optional AsyncTokenBucket to share across runs, so
+            concurrent sessions together stay under the deployment's quota.
+            Takes precedence over requests_per_minute.
+        score_cache_path: Optional SQLite file (see ScoreCache) to reuse
+            per-profile scores across runs for the same user profile.
+        max_final_candidates: Cap on profiles sent to each final report, taken
+            in score order (None sends everyone above min_score).
+        min_shared_keywords: If > 0, attendees sharing fewer distinctive
+            keywords than this with the user's profile skip the model and
+            score 0. Off by default: it trades a little recall for fewer calls.
+        max_concurrent: Max scoring requests in flight at once. Raise it for
+            deployments with more TPM headroom; 429s are retried with backoff.
+        use_batch_api: Submit the scoring pass as one Azure Batch API job
+            (cheaper, but queued — can take minutes or longer). The final
+            reports always use the live API.
+        scoring_deployments: Optional list of deployment names (on the same
+            Azure resource) to spread scoring batches across for more aggregate
+            TPM. Defaults to [azure_deployment]. Final reports always use
+            azure_deployment.
+        client: Optional AsyncAzureOpenAI (see create_azure_client) to reuse
+            across runs, keeping its warm connections. Built from the key and
+            endpoint when omitted.
+        profile_texts: Optional precomputed build_profile_corpus(df_filtered),
+            so repeated runs over the same data skip re-serializing profiles.
 
     Returns:
         Tuple of (get_result, give_result) where each result is
@@ -569,43 +1189,55 @@ async def run_dual_matching_pipeline(df_filtered, user_name, user_profile,
         The full shared Stage-1 usage is attributed to get_result; give_result's
         stage1 is empty, so summing get+give (as the UI does) stays correct.
     """
-    client = AsyncAzureOpenAI(
-        api_key=azure_api_key,
-        azure_endpoint=azure_endpoint,
-        api_version=azure_api_version,
-    )
-
-    # Exclude the user's own profile from scoring
-    indices = df_filtered.index.tolist()
+    if client is None:
+        client = create_azure_client(azure_api_key, azure_endpoint, azure_api_version)
+    if profile_texts is None:
+        profile_texts = build_profile_corpus(df_filtered)
+
+    # Exclude the user's own profile once, before batching, so it is never
+    # serialized into any prompt.
+    candidates = df_filtered.index
     scoring_status = []
-    if user_idx is not None and user_idx in indices:
-        indices = [i for i in indices if i != user_idx]
+    if user_idx is not None and user_idx in candidates:
+        candidates = candidates.drop(user_idx)
         scoring_status.append(f"Excluded own profile (index {user_idx})")
+    indices = candidates.tolist()
     total_count = len(indices)
 
     # Caps in-flight requests so we don't overwhelm the deployment with 429s.
-    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    semaphore = asyncio.Semaphore(max_concurrent)
+    if rate_limiter is None and requests_per_minute:
+        rate_limiter = AsyncTokenBucket(requests_per_minute)
 
     # Stable per-user routing hint so every batch in this run pins to the same
     # backend and reuses the warmed prompt-cache prefix.
     cache_key = "eag-score-" + hashlib.sha256(user_profile.encode("utf-8")).hexdigest()[:16]
 
     # Stage 1: score all profiles once on both dimensions.
-    get_scores, give_scores, stage1_usage = await _score_all_batches(
-        df_filtered, user_profile, client, azure_deployment, indices,
-        total_count, chunk_size, cache_key, semaphore, progress_callback, scoring_status
-    )
+    score_cache = ScoreCache(score_cache_path) if score_cache_path else None
+    try:
+        get_scores, give_scores, stage1_usage = await _score_all_batches(
+            profile_texts, user_profile, client, scoring_deployments or [azure_deployment], indices,
+            total_count, chunk_size, cache_key, semaphore, progress_callback, scoring_status,
+            use_batch_api=use_batch_api, rate_limiter=rate_limiter, score_cache=score_cache,
+            min_shared_keywords=min_shared_keywords,
+        )
+    finally:
+        if score_cache is not None:
+            score_cache.close()
 
     # Stage 2: generate both final reports concurrently.
     get_out, give_out = await asyncio.gather(
         _generate_final_report(
-            df_filtered, user_name, user_profile, client, azure_deployment,
+            profile_texts, user_name, user_profile, client, azure_deployment,
             get_scores, "get_value", min_score, additional_context,
-            total_count, final_callback),
+            total_count, final_callback, report_callback, stream_callback, rate_limiter,
+            max_final_candidates),
         _generate_final_report(
-            df_filtered, user_name, user_profile, client, azure_deployment,
+            profile_texts, user_name, user_profile, client, azure_deployment,
             give_scores, "give_value", min_score, additional_context,
-            total_count, final_callback),
+            total_count, final_callback, report_callback, stream_callback, rate_limiter,
+            max_final_candidates),
     )
     get_text, get_status, get_stage2 = get_out
     give_text, give_status, give_stage2 = give_out
@@ -620,6 +1252,44 @@ async def run_dual_matching_pipeline(df_filtered, user_name, user_profile,
     return get_result, give_result
 
 
+# Characters replaced with "_" when building output filenames
+_FILENAME_UNSAFE_RE = re.compile(r'[^\w]')
+
+
+def _output_paths(full_name, output_dir, suffix):
+    """Timestamped (.md, .txt) paths for one saved report."""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    clean_name = _FILENAME_UNSAFE_RE.sub('_', full_name.lower())
+    base_filename = f"{timestamp}_{clean_name}_recommendations{suffix}"
+    return (os.path.join(output_dir, f"{base_filename}.md"),
+            os.path.join(output_dir, f"{base_filename}.txt"))
+
+
+def _write_text(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+_slack_converters = threading.local()
+
+
+def _slack_converter():
+    """This thread's SlackMarkdownConverter, built once and then reused.
+
+    convert() keeps state on the instance while it runs, so concurrent saves
+    on different worker threads must not share one.
+    """
+    converter = getattr(_slack_converters, "converter", None)
+    if converter is None:
+        converter = _slack_converters.converter = SlackMarkdownConverter()
+    return converter
+
+
+def _write_slack(path, content):
+    """Convert markdown to Slack format and save it."""
+    _write_text(path, _slack_converter().convert(content))
+
+
 def save_output(full_name, content, output_dir, suffix=""):
     """
     Save the output to timestamped .md and .txt (Slack format) files.
@@ -630,21 +1300,21 @@ def save_output(full_name, content, output_dir, suffix=""):
     Returns:
         Tuple of (md_filepath, txt_filepath)
     """
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    clean_name = re.sub(r'[^\w]', '_', full_name.lower())
-    base_filename = f"{timestamp}_{clean_name}_recommendations{suffix}"
-
-    # Save markdown version
-    md_filepath = os.path.join(output_dir, f"{base_filename}.md")
-    with open(md_filepath, 'w', encoding='utf-8') as f:
-        f.write(content)
+    md_filepath, txt_filepath = _output_paths(full_name, output_dir, suffix)
+    _write_text(md_filepath, content)
+    _write_slack(txt_filepath, content)
+    return md_filepath, txt_filepath
 
-    # Convert to Slack format and save .txt
-    converter = SlackMarkdownConverter()
-    slack_content = converter.convert(content)
 
-    txt_filepath = os.path.join(output_dir, f"{base_filename}.txt")
-    with open(txt_filepath, 'w', encoding='utf-8') as f:
-        f.write(slack_content)
+async def save_output_async(full_name, content, output_dir, suffix=""):
+    """save_output without blocking the event loop.
 
+    The markdown write and the Slack conversion + write run concurrently on
+    worker threads.
+    """
+    md_filepath, txt_filepath = _output_paths(full_name, output_dir, suffix)
+    await asyncio.gather(
+        asyncio.to_thread(_write_text, md_filepath, content),
+        asyncio.to_thread(_write_slack, txt_filepath, content),
+    )
     return md_filepath, txt_filepath